@@ -0,0 +1,17 @@
+# gunicorn settings for: gunicorn tasas_ecuanomia_dash:server
+
+# Import the app in the master before forking. Importing loads no data, so
+# workers bind and answer /health immediately.
+preload_app = True
+
+# Threads per worker, so a long streamed export does not keep the worker
+# from answering the dashboard's callbacks
+threads = 4
+
+
+def post_worker_init(worker):
+    # Each worker maps the dataset snapshot (building it first if the CSV
+    # changed) in the background. The mapped columns and indexes are shared
+    # with the other workers through the page cache.
+    from tasas_data import registry
+    registry.load_in_background()
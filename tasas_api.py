@@ -0,0 +1,167 @@
+import numpy as np
+
+from tasas_cache import get_results
+from tasas_data import CALIFICACIONES_ORDER
+from tasas_export import EXPORT_FORMATS, export_filename, export_months, iter_export, parquet_available
+from tasas_http import versioned_response
+from tasas_query import best_rows, filter_options, filter_spec
+
+API_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_BEST = 100
+
+# JSON field names of the offer columns
+OFFER_FIELDS = {
+    'razon_social': 'razon_social',
+    'ULTIMA_CALIFICACIÓN': 'calificacion',
+    'plazo': 'plazo',
+    'tasa_pasiva_efectiva': 'tasa',
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def offer_records(table):
+    """Return the offers of ``table`` as compact dicts; missing values are null"""
+    columns = []
+    for column in OFFER_FIELDS:
+        values = table[column].to_numpy()
+        if column == 'tasa_pasiva_efectiva':
+            # float32 rates would serialize as 6.440000057220459
+            values = np.round(values.astype(np.float64), 4)
+        columns.append(values.tolist())
+    return [
+        {field: (None if value != value else value) for field, value in zip(OFFER_FIELDS.values(), record)}
+        for record in zip(*columns)
+    ]
+
+
+def int_arg(args, name, default=None, low=None, high=None):
+    value = args.get(name, default)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ApiError(f"'{name}' debe ser un número entero")
+    if (low is not None and value < low) or (high is not None and value > high):
+        raise ApiError(f"'{name}' debe estar entre {low} y {high}")
+    return value
+
+
+def min_calif_arg(args):
+    min_calif = args.get('calificacion_minima')
+    if min_calif and min_calif not in CALIFICACIONES_ORDER:
+        raise ApiError(f"Calificación fuera de la escala: {min_calif}")
+    return min_calif
+
+
+def register_api(app, registry, prefix='/api'):
+    """Serve the offers of the in-process dataset as JSON on the server of Dash ``app``.
+
+    ``GET {prefix}/ofertas`` pages through the offers of one month, best rate
+    first, with the same filters as the dashboard (``mes``, ``q``,
+    ``calificacion``, ``calificacion_minima``, ``plazo``) plus ``page`` and
+    ``page_size``.
+
+    ``GET {prefix}/mejores`` returns the ``n`` best offers of each plazo (or
+    of the given ``plazo``), optionally for one ``calificacion`` or for
+    every rating at least ``calificacion_minima``.
+
+    ``GET {prefix}/export`` streams the filtered offers of ``mes``, or of the
+    months from ``desde`` to ``mes``, as a CSV or Parquet (``formato``) file.
+
+    Responses carry an ETag derived from the dataset version and the URL, so
+    clients and proxies revalidate them with a 304 until the data changes.
+    """
+    import flask
+
+    server = app.server
+
+    def request_dataset(args):
+        if registry.loaded() is None:
+            raise ApiError("Los datos se están cargando", status=503)
+        dataset = registry.refresh()
+        mes = args.get('mes') or dataset.latest_month
+        if mes not in dataset.month_ranges:
+            raise ApiError(f"Mes desconocido: {mes}", status=404)
+        return dataset, mes
+
+    @server.errorhandler(ApiError)
+    def api_error(error):
+        response = flask.jsonify(error=str(error))
+        response.status_code = error.status
+        if error.status == 503:
+            response.headers['Retry-After'] = '5'
+        return response
+
+    @server.route(prefix + '/ofertas')
+    def api_ofertas():
+        args = flask.request.args
+        dataset, mes = request_dataset(args)
+        page = int_arg(args, 'page', 1, low=1)
+        page_size = int_arg(args, 'page_size', API_PAGE_SIZE, low=1, high=MAX_PAGE_SIZE)
+        plazo = int_arg(args, 'plazo')
+        min_calif = min_calif_arg(args)
+
+        def build():
+            result = get_results(dataset, mes, args.get('q', ''), args.get('calificacion'), plazo, min_calif)
+            start = (page - 1) * page_size
+            return flask.jsonify(
+                version=dataset.version,
+                mes=mes,
+                total=len(result),
+                page=page,
+                page_size=page_size,
+                ofertas=offer_records(result.table.iloc[start:start + page_size])
+            )
+
+        return versioned_response(dataset.version, build)
+
+    @server.route(prefix + '/mejores')
+    def api_mejores():
+        args = flask.request.args
+        dataset, mes = request_dataset(args)
+        n = int_arg(args, 'n', 5, low=1, high=MAX_BEST)
+        plazo = int_arg(args, 'plazo')
+        calif = args.get('calificacion')
+        min_calif = min_calif_arg(args)
+
+        def build():
+            plazos = [plazo] if plazo is not None else filter_options(dataset.month(mes))[1]
+            mejores = []
+            for plazo_mejor in plazos:
+                rows = best_rows(dataset, filter_spec(mes, calif=calif, plazo=plazo_mejor, min_calif=min_calif), n)
+                mejores.append({'plazo': plazo_mejor, 'ofertas': offer_records(dataset.df.take(rows))})
+            return flask.jsonify(version=dataset.version, mes=mes, n=n, mejores=mejores)
+
+        return versioned_response(dataset.version, build)
+
+    @server.route(prefix + '/export')
+    def api_export():
+        args = flask.request.args
+        dataset, mes = request_dataset(args)
+        fmt = args.get('formato', 'csv')
+        if fmt not in EXPORT_FORMATS or (fmt == 'parquet' and not parquet_available()):
+            raise ApiError(f"Formato no disponible: {fmt}")
+        desde = args.get('desde')
+        if desde and desde not in dataset.month_ranges:
+            raise ApiError(f"Mes desconocido: {desde}", status=404)
+        months = export_months(dataset, mes, desde)
+        plazo = int_arg(args, 'plazo')
+        min_calif = min_calif_arg(args)
+
+        def build():
+            # Sent in batches as they are built, never as one body
+            chunks = iter_export(dataset, fmt, months, args.get('q'), args.get('calificacion'), plazo, min_calif)
+            response = flask.Response(chunks, mimetype=EXPORT_FORMATS[fmt][0])
+            response.headers['Content-Disposition'] = f'attachment; filename="{export_filename(fmt, months)}"'
+            return response
+
+        return versioned_response(dataset.version, build)
+
+    return server
@@ -0,0 +1,299 @@
+"""Benchmark suite for the tasas dashboards on synthetic data.
+
+Generates a realistic tasas CSV of the requested size and times each stage
+of the apps one at a time: CSV ingestion, snapshot load, month filtering,
+search, KPI computation, trend slices, biggest movers, the Dash table and
+mobile-card builds and the Streamlit script body. Every stage reports its
+timings and peak traced memory, and the results can be saved as a JSON
+baseline and compared against a previous one.
+
+    python tasas_benchmark.py --rows 1000000 --entities 200 --months 60 \\
+        --output baseline.json
+    python tasas_benchmark.py --rows 1000000 --compare baseline.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import tasas_data
+
+BENCH_CSV = tasas_data.url_path
+
+RATINGS = ['AAA', 'AAA-', 'AA+', 'AA', 'AA-', 'A+', 'A', 'A-',
+           'BBB+', 'BBB', 'BBB-', 'BB+', 'BB', 'B+', 'B', 'C', 'NR']
+PLAZOS = [30, 60, 90, 120, 180, 270, 360, 361, 540, 720, 1080]
+ENTITY_KINDS = ['BANCO', 'COOPERATIVA DE AHORRO Y CRÉDITO', 'MUTUALISTA', 'SOCIEDAD FINANCIERA']
+SEARCH_TERMS = ['banco', 'credito', 'cooperativa 1', 'mutualista pichincha', 'zzz']
+
+
+def entity_names(n):
+    """Return ``n`` distinct entity names in the style of the real data"""
+    names = []
+    for i in range(n):
+        kind = ENTITY_KINDS[i % len(ENTITY_KINDS)]
+        if kind == 'COOPERATIVA DE AHORRO Y CRÉDITO':
+            names.append(f"{kind} {i} LTDA")
+        else:
+            names.append(f"{kind} {i}")
+    return names
+
+
+def generate_month(rng, mes, rows, entities, entity_ratings, entity_premium):
+    """Build ``rows`` synthetic offers for one month"""
+    entity = rng.integers(0, len(entities), rows)
+    plazo = rng.choice(PLAZOS, rows)
+    # Longer terms and riskier entities pay more, plus some noise
+    rate = 3.0 + 1.2 * np.log(plazo / 30) + entity_premium[entity] + rng.normal(0, 0.6, rows)
+    calificacion = entity_ratings[entity].astype(object)
+    calificacion[rng.random(rows) < 0.01] = None
+    return pd.DataFrame({
+        'mes': mes,
+        'razon_social': entities[entity],
+        'ULTIMA_CALIFICACIÓN': calificacion,
+        'plazo': plazo,
+        'tasa_pasiva_efectiva': np.clip(rate, 0.5, 15.0).round(4),
+    })
+
+
+def generate_tasas(path, rows, entities=80, months=24, start='2024-01', seed=0):
+    """Write a synthetic tasas CSV with ``rows`` offers to ``path``.
+
+    Rows are spread evenly over ``months`` consecutive months starting at
+    ``start``, and written one month at a time so memory stays bounded.
+    """
+    rng = np.random.default_rng(seed)
+    names = np.array(entity_names(entities), dtype=object)
+    entity_ratings = rng.choice(RATINGS, entities)
+    entity_premium = rng.uniform(0.0, 3.0, entities)
+    month_labels = pd.period_range(start, periods=months, freq='M').astype(str)
+
+    per_month = np.full(months, rows // months)
+    per_month[:rows % months] += 1
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        for i, (mes, n) in enumerate(zip(month_labels, per_month)):
+            frame = generate_month(rng, mes, int(n), names, entity_ratings, entity_premium)
+            frame.to_csv(f, index=False, header=i == 0)
+    return path
+
+
+def measure(func, repeat):
+    """Time ``func`` ``repeat`` times, then trace one more run for peak memory"""
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'min_s': min(timings),
+        'median_s': statistics.median(timings),
+        'max_s': max(timings),
+        'repeat': repeat,
+        'peak_bytes': peak,
+    }
+
+
+def run_benchmarks(csv_path, repeat=5, include_streamlit=True):
+    """Run every stage against the tasas CSV at ``csv_path``.
+
+    Returns the dataset's shape and a {stage: stats} dict.
+    """
+    snapshot = tasas_data.snapshot_path(csv_path)
+    results = {}
+
+    def csv_ingest():
+        shutil.rmtree(snapshot, ignore_errors=True)
+        tasas_data.ingest_csv(csv_path)
+
+    def snapshot_open():
+        tasas_data.open_snapshot(csv_path)
+
+    results['csv_ingest'] = measure(csv_ingest, repeat)
+    results['snapshot_open'] = measure(snapshot_open, repeat)
+
+    dataset = tasas_data.load_dataset(csv_path)
+    mes = dataset.latest_month
+    months = dataset.months
+    plazos = sorted(dataset.df['plazo'].dropna().unique().tolist())
+    ratings = sorted(dataset.df['ULTIMA_CALIFICACIÓN'].dropna().unique().tolist())
+
+    from tasas_cache import result_cache
+    from tasas_query import filter_spec, query, top_movers, trend_series
+
+    def month_filter():
+        for m in months:
+            dataset.month(m)
+
+    def search():
+        for term in SEARCH_TERMS:
+            dataset.search(mes, filter_spec(mes, term).search)
+
+    def kpis():
+        for calif in ['Todos'] + ratings:
+            for plazo in ['Todos'] + plazos:
+                dataset.kpis(mes, calif, plazo)
+
+    def filter_results():
+        for term in ('', 'banco'):
+            query(dataset, filter_spec(mes, term))
+
+    def trend():
+        entities = list(dataset.trends.entities)[:10]
+        trend_series(dataset, entities, plazos)
+
+    def movers():
+        for column in ('delta_mes', 'delta_anual'):
+            top_movers(dataset, filter_spec(mes), column)
+
+    results['month_filter'] = measure(month_filter, repeat)
+    results['search'] = measure(search, repeat)
+    results['kpis'] = measure(kpis, repeat)
+    results['filter_results'] = measure(filter_results, repeat)
+    results['trend'] = measure(trend, repeat)
+    results['movers'] = measure(movers, repeat)
+
+    # The Dash app loads the CSV of the working directory on import
+    import tasas_ecuanomia_dash as dash_app
+
+    version = dataset.version
+
+    def dash_table():
+        result_cache.clear()
+        table = dash_app.get_results(dash_app.registry.get(version), mes, '', 'Todos', 'Todos').table
+        page_df, _ = dash_app.query_table_page(
+            table, [{'column_id': 'tasa_pasiva_efectiva', 'direction': 'asc'}],
+            '{plazo} >= 90', 0, 20
+        )
+        dash_app.table_records(page_df)
+
+    def dash_mobile_cards():
+        result_cache.clear()
+        table = dash_app.get_results(dash_app.registry.get(version), mes, '', 'Todos', 'Todos').table
+        for start in range(0, min(len(table), 5 * dash_app.MOBILE_PAGE_SIZE), dash_app.MOBILE_PAGE_SIZE):
+            dash_app.table_records(table.iloc[start:start + dash_app.MOBILE_PAGE_SIZE])
+
+    results['dash_table'] = measure(dash_table, repeat)
+    results['dash_mobile_cards'] = measure(dash_mobile_cards, repeat)
+
+    if include_streamlit:
+        from streamlit.testing.v1 import AppTest
+
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tasas_ecuanomia.py')
+
+        def streamlit_script():
+            result_cache.clear()
+            app = AppTest.from_file(script, default_timeout=600).run()
+            if app.exception:
+                raise RuntimeError(app.exception[0].value)
+
+        results['streamlit_script'] = measure(streamlit_script, repeat)
+
+    shape = {
+        'rows': len(dataset),
+        'entities': int(dataset.df['razon_social'].nunique()),
+        'months': len(months),
+    }
+    return shape, results
+
+
+def format_bytes(n):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return f"{n:.1f} {unit}" if unit != 'B' else f"{n} B"
+        n /= 1024
+
+
+def print_report(report, baseline=None):
+    """Print the stage timings, with the ratio to ``baseline`` when given"""
+    params = report['params']
+    print(f"tasas benchmark: {params['rows']:,} rows, {params['entities']} entities, "
+          f"{params['months']} months (python {report['python']}, pandas {report['pandas']})")
+    header = f"{'stage':<20}{'median':>12}{'min':>12}{'peak mem':>12}"
+    if baseline:
+        header += f"{'vs base':>10}"
+    print(header)
+    for stage, stats in report['stages'].items():
+        line = (f"{stage:<20}{stats['median_s'] * 1000:>10.2f}ms{stats['min_s'] * 1000:>10.2f}ms"
+                f"{format_bytes(stats['peak_bytes']):>12}")
+        base = baseline['stages'].get(stage) if baseline else None
+        if base:
+            line += f"{stats['median_s'] / base['median_s']:>9.2f}x"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10_000)
+    parser.add_argument('--entities', type=int, default=80)
+    parser.add_argument('--months', type=int, default=24)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--csv', help="benchmark an existing tasas CSV instead of generating one")
+    parser.add_argument('--workdir', help="directory for the generated data (default: a temporary one)")
+    parser.add_argument('--no-streamlit', action='store_true', help="skip the Streamlit script stage")
+    parser.add_argument('--output', help="write the results as a JSON baseline")
+    parser.add_argument('--compare', help="JSON baseline to compare against")
+    args = parser.parse_args(argv)
+
+    # Both apps read tasas_2024_forward.csv from the working directory
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    workdir = args.workdir or tempfile.mkdtemp(prefix='tasas-bench-')
+    os.makedirs(workdir, exist_ok=True)
+    csv_path = os.path.join(workdir, BENCH_CSV)
+    if args.csv:
+        shutil.copyfile(args.csv, csv_path)
+    else:
+        generate_tasas(csv_path, args.rows, args.entities, args.months, seed=args.seed)
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        shape, stages = run_benchmarks(BENCH_CSV, args.repeat, include_streamlit=not args.no_streamlit)
+    finally:
+        os.chdir(cwd)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'params': dict(shape, seed=None if args.csv else args.seed, csv=args.csv),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'stages': stages,
+    }
+    print_report(report, baseline)
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from tasas_query import filter_options, filter_spec, query
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """Bounded LRU cache of FilterResults keyed by dataset version and filters.
+
+    Entries are evicted least-recently-used first once either ``max_entries``
+    or ``max_bytes`` is exceeded. Results of several dataset versions live
+    side by side, so clients still on the previous version don't empty the
+    cache; ``retain`` drops the versions a registry no longer keeps.
+
+    Concurrent misses on one key compute it once: the first caller runs
+    ``compute`` and the others wait for its result.
+    """
+
+    def __init__(self, max_entries=512, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._pending = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.computes = 0
+        self.shared = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_or_compute(self, version, spec, compute):
+        """Return the cached result for (version, spec), computing it on a miss"""
+        key = (version, spec)
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+            self.misses += 1
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = Future()
+                self.computes += 1
+                owner = True
+            else:
+                self.shared += 1
+                owner = False
+
+        if not owner:
+            return pending.result()
+
+        # Compute outside the lock; misses on the same key wait for this one
+        try:
+            result = compute()
+        except BaseException as exc:
+            with self._lock:
+                del self._pending[key]
+            pending.set_exception(exc)
+            raise
+
+        with self._lock:
+            del self._pending[key]
+            self._entries[key] = result
+            self.nbytes += result.nbytes
+            self._evict()
+        pending.set_result(result)
+        return result
+
+    def retain(self, versions):
+        """Drop the results of every dataset version not in ``versions``"""
+        versions = set(versions)
+        with self._lock:
+            dropped = {version for version, _ in self._entries if version not in versions}
+            for key in [key for key in self._entries if key[0] in dropped]:
+                self.nbytes -= self._entries.pop(key).nbytes
+            self.invalidations += len(dropped)
+
+    def follow(self, registry):
+        """Keep only the results of the versions ``registry`` still serves"""
+        registry.subscribe(lambda dataset: self.retain(registry.versions()))
+
+    def clear(self):
+        """Drop every cached result"""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        """Return the cache counters as a dict"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.nbytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'computes': self.computes,
+                'shared': self.shared,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self.nbytes > self.max_bytes):
+            _, result = self._entries.popitem(last=False)
+            self.nbytes -= result.nbytes
+            self.evictions += 1
+
+
+# Process-wide cache used by both the Dash and the Streamlit app
+result_cache = ResultCache()
+
+
+def get_results(dataset, mes, search, calif, plazo, min_calif=None):
+    """Return the (cached) FilterResult for a filter selection on ``dataset``"""
+    spec = filter_spec(mes, search, calif, plazo, min_calif)
+    return result_cache.get_or_compute(
+        dataset.version, spec, lambda: query(dataset, spec)
+    )
+
+
+class CacheWarmer:
+    """Precomputes the results of every rating × plazo combination in the background.
+
+    For the latest month of a dataset it enumerates the options
+    populate_dropdowns offers ('Todos' included) and fills the result
+    cache with each combination, without a search text, on a daemon
+    thread. Warming a newer dataset supersedes a run still in progress.
+    """
+
+    def __init__(self, cache=None, max_results=None):
+        self.cache = cache or result_cache
+        # Leave room in the cache for what users actually ask for
+        self.max_results = max_results or self.cache.max_entries // 2
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.version = None
+        self.total = 0
+        self.done = 0
+        self.started = None
+        self.seconds = None
+
+    def warm(self, dataset):
+        """Start warming the cache for ``dataset``; returns the thread"""
+        mes = dataset.latest_month
+        calificaciones, plazos = filter_options(dataset.month(mes))
+        combinations = [
+            (calif, plazo)
+            for calif in ['Todos'] + calificaciones
+            for plazo in ['Todos'] + plazos
+        ][:self.max_results]
+
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            self.version = dataset.version
+            self.total = len(combinations)
+            self.done = 0
+            self.started = time.monotonic()
+            self.seconds = None
+
+        thread = threading.Thread(
+            target=self._run, args=(generation, dataset, mes, combinations),
+            name='tasas-warmup', daemon=True
+        )
+        thread.start()
+        return thread
+
+    def _run(self, generation, dataset, mes, combinations):
+        logger.info("Warming %d results for %s (version %s)", len(combinations), mes, dataset.version)
+        for calif, plazo in combinations:
+            if generation != self._generation:
+                logger.info("Warm-up of version %s superseded", dataset.version)
+                return
+            spec = filter_spec(mes, '', calif, plazo)
+            self.cache.get_or_compute(dataset.version, spec, lambda: query(dataset, spec))
+            with self._lock:
+                if generation == self._generation:
+                    self.done += 1
+            # Let request threads in between results
+            time.sleep(0)
+
+        with self._lock:
+            if generation == self._generation:
+                self.seconds = time.monotonic() - self.started
+        logger.info("Warmed %d results for %s in %.2fs", len(combinations), mes, self.seconds or 0.0)
+
+    def stats(self):
+        """Return the progress of the latest warm-up as a dict"""
+        with self._lock:
+            return {
+                'total': self.total,
+                'done': self.done,
+                'running': int(self.started is not None and self.seconds is None),
+                'seconds': self.seconds if self.seconds is not None else 0.0,
+            }
+
+
+# Process-wide warmer for the shared result cache
+cache_warmer = CacheWarmer()
@@ -0,0 +1,27 @@
+import plotly.graph_objects as go
+
+
+def trend_figure(months, series):
+    """Line chart of monthly rates, one line per (label, values) in ``series``"""
+    fig = go.Figure()
+    for label, values in series:
+        fig.add_trace(go.Scatter(
+            x=months,
+            y=values,
+            mode='lines+markers',
+            name=label,
+            hovertemplate='%{x}: %{y:.2f}%<extra>%{fullData.name}</extra>'
+        ))
+    fig.update_layout(
+        xaxis_title="Mes",
+        yaxis_title="Tasa pasiva efectiva",
+        yaxis_ticksuffix='%',
+        legend={'orientation': 'h', 'yanchor': 'top', 'y': -0.2},
+        margin={'l': 40, 'r': 20, 't': 20, 'b': 40},
+        hovermode='x unified',
+        template='plotly_white'
+    )
+    if not series:
+        fig.add_annotation(text="Seleccione entidades y plazos con datos", showarrow=False,
+                           xref='paper', yref='paper', x=0.5, y=0.5)
+    return fig
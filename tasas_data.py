@@ -0,0 +1,1302 @@
+import bisect
+import contextlib
+import functools
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unicodedata
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+try:
+    import fcntl
+except ImportError:  # Windows: snapshot builds are not serialized across processes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Default location of the published tasas history
+url_path = "tasas_2024_forward.csv"
+
+# Columns of the "Todas las ofertas" table, in display order
+TABLE_COLUMNS = ['razon_social', 'ULTIMA_CALIFICACIÓN', 'plazo', 'tasa_pasiva_efectiva']
+
+# Columns the apps use; anything else in the CSV is skipped on ingestion
+CSV_COLUMNS = ['mes', 'razon_social', 'ULTIMA_CALIFICACIÓN', 'plazo', 'tasa_pasiva_efectiva']
+CATEGORY_COLUMNS = ['mes', 'razon_social', 'ULTIMA_CALIFICACIÓN']
+
+# Rating scale, best first. The rating column is an ordered categorical in
+# this order, with ratings outside the scale after it
+CALIFICACIONES_ORDER = [
+    "AAA", "AAA-", "AA+", "AA", "AA-",
+    "A+", "A", "A-",
+    "BBB+", "BBB", "BBB-",
+    "BB+", "BB", "BB-",
+    "B+", "B", "B-"
+]
+RATING_RANK = {cal: i for i, cal in enumerate(CALIFICACIONES_ORDER)}
+
+# Rows parsed at a time when streaming the CSV into its snapshot
+CHUNK_ROWS = 200_000
+
+# Layout of the snapshot files; snapshots in another format are rebuilt
+SNAPSHOT_FORMAT = 3
+
+# How much of the end of the previous file must be unchanged for a reload to
+# treat the new file as an append
+TAIL_BYTES = 64 * 1024
+
+
+class Dataset:
+    """Typed tasas DataFrame plus the version key that identifies it.
+
+    Rows are sorted by ``mes`` and each month occupies one contiguous row
+    range, so ``month()`` is a slice rather than a scan of the whole history.
+
+    Datasets are treated as read-only once built: callbacks receive the same
+    object on every request, so they must never mutate ``df`` in place.
+    """
+
+    def __init__(self, df, version, source=None, stat=None, indexes=None):
+        self.df = df
+        # Content hash of the CSV; identical files share a version everywhere
+        self.version = version
+        # Size and tail fingerprint of the CSV this dataset was parsed from,
+        # used to detect pure appends on reload
+        self.source = source
+        # Cheap mtime/size key, used to notice that the file may have changed
+        self.stat = stat
+        self.months, self.month_ranges = build_month_index(df['mes'])
+        self._month_codes = {mes: code for code, mes in enumerate(df['mes'].cat.categories)}
+
+        # Derived indexes come prebuilt from the snapshot when available
+        indexes = indexes or build_indexes(df, len(self._month_codes))
+        self.search_index = indexes['search']
+        self.cube = indexes['cube']
+        self.trends = indexes['trends']
+        self.deltas = indexes['deltas']
+        self._month_columns = np.array([self._month_codes[mes] for mes in self.months], dtype=np.intp)
+
+    def __len__(self):
+        return len(self.df)
+
+    @property
+    def indexes(self):
+        """The derived indexes stored alongside the columns in a snapshot"""
+        return {'search': self.search_index, 'cube': self.cube, 'trends': self.trends, 'deltas': self.deltas}
+
+    @property
+    def latest_month(self):
+        return self.months[-1] if self.months else None
+
+    def month(self, mes):
+        """Return the rows of month ``mes`` (empty if the month is unknown)"""
+        start, stop = self.month_ranges.get(mes, (0, 0))
+        return self.df.iloc[start:stop]
+
+    def kpis(self, mes, calif='Todos', plazo='Todos', min_calif='Todos'):
+        """Return the KPIs of one (mes, calificación, plazo) cell of the cube.
+
+        With ``min_calif`` the cells of every rating at least that good
+        are combined.
+        """
+        return self.cube.kpis(self.month_code(mes), calif, plazo, min_calif)
+
+    def month_code(self, mes):
+        """Return the category code of month ``mes``, or None if it is unknown"""
+        return self._month_codes.get(mes)
+
+    def trend(self, entity, plazo):
+        """Return the mean rate of ``entity`` at ``plazo`` for each of ``months`` (NaN if absent)"""
+        values = self.trends.series(entity, plazo)
+        if values is None:
+            return np.full(len(self.months), np.nan, dtype=np.float32)
+        return values[self._month_columns]
+
+    def search(self, mes, text):
+        """Return the sorted row positions of month ``mes`` whose entity name contains ``text``"""
+        if mes not in self._month_codes:
+            return np.empty(0, dtype=np.intp)
+        entities = self.search_index.match(text)
+        return self.search_index.rows(self._month_codes[mes], entities)
+
+
+class AggregateCube:
+    """Precomputed KPI aggregates per (mes, calificación, plazo) cell.
+
+    Every cell holds the row count, the sum, minimum and maximum of
+    ``tasa_pasiva_efectiva`` and a packed bitmap of the entities present.
+    Index 0 on the rating and plazo axes is the 'Todos' rollup. The last
+    index collects rows with a missing value, which only count towards the
+    rollups. KPI lookups without a search text are then O(1).
+
+    The cells are accumulated ``block_rows`` rows at a time.
+    """
+
+    def __init__(self, df, n_months, block_rows=CHUNK_ROWS):
+        self.ratings = {rating: code + 1 for code, rating in enumerate(df['ULTIMA_CALIFICACIÓN'].cat.categories)}
+        plazos = sorted_plazos(df['plazo'], block_rows)
+        self.plazos = {plazo: code + 1 for code, plazo in enumerate(plazos)}
+
+        n_ratings = len(self.ratings) + 2
+        n_plazos = len(self.plazos) + 2
+        n_entities = len(df['razon_social'].cat.categories)
+        shape = (n_months, n_ratings, n_plazos)
+        size = int(np.prod(shape))
+
+        count = np.zeros(size, dtype=np.int64)
+        rated = np.zeros(size, dtype=np.int64)
+        total = np.zeros(size)
+        low = np.full(size, np.inf)
+        high = np.full(size, -np.inf)
+        entities = np.zeros((size, n_entities), dtype=bool)
+
+        plazo_index = pd.Index(plazos)
+        mes_codes = df['mes'].cat.codes.to_numpy()
+        rating_codes = df['ULTIMA_CALIFICACIÓN'].cat.codes.to_numpy()
+        entity_codes = df['razon_social'].cat.codes.to_numpy()
+        plazo_values = df['plazo'].to_numpy()
+        rate_values = df['tasa_pasiva_efectiva'].to_numpy()
+        for block in row_blocks(len(df), block_rows):
+            rating_slots = rating_codes[block].astype(np.int64) + 1
+            rating_slots[rating_slots == 0] = n_ratings - 1
+            plazo_slots = plazo_index.get_indexer(plazo_values[block]).astype(np.int64) + 1
+            plazo_slots[plazo_slots == 0] = n_plazos - 1
+            cells = np.ravel_multi_index((mes_codes[block], rating_slots, plazo_slots), shape)
+
+            # Missing rates count as rows but are skipped by the rate aggregates
+            rates = rate_values[block].astype(np.float64)
+            has_rate = ~np.isnan(rates)
+            count += np.bincount(cells, minlength=size)
+            rated += np.bincount(cells[has_rate], minlength=size)
+            total += np.bincount(cells[has_rate], weights=rates[has_rate], minlength=size)
+            np.minimum.at(low, cells[has_rate], rates[has_rate])
+            np.maximum.at(high, cells[has_rate], rates[has_rate])
+
+            block_entities = entity_codes[block]
+            has_entity = block_entities >= 0
+            entities[cells[has_entity], block_entities[has_entity]] = True
+
+        count, rated, total = count.reshape(shape), rated.reshape(shape), total.reshape(shape)
+        low, high = low.reshape(shape), high.reshape(shape)
+        entities = entities.reshape(shape + (n_entities,))
+
+        # 'Todos' rollups: first over ratings for each plazo, then over plazos
+        # (which includes the rating rollup and so yields the month total)
+        for axis in (1, 2):
+            rest = (slice(None),) * axis + (slice(1, None),)
+            rollup = (slice(None),) * axis + (0,)
+            count[rollup] = count[rest].sum(axis=axis)
+            rated[rollup] = rated[rest].sum(axis=axis)
+            total[rollup] = total[rest].sum(axis=axis)
+            low[rollup] = low[rest].min(axis=axis)
+            high[rollup] = high[rest].max(axis=axis)
+            entities[rollup] = entities[rest].any(axis=axis)
+
+        self.count = count
+        self.rated = rated
+        self.total = total
+        self.low = low
+        self.high = high
+        self.nunique = entities.sum(axis=-1)
+        self.entities = np.packbits(entities, axis=-1)
+
+    ARRAYS = ('count', 'rated', 'total', 'low', 'high', 'nunique', 'entities')
+
+    def to_snapshot(self):
+        """Return the JSON state and the arrays of this cube"""
+        state = {'ratings': list(self.ratings), 'plazos': list(self.plazos)}
+        return state, {name: getattr(self, name) for name in self.ARRAYS}
+
+    @classmethod
+    def from_snapshot(cls, state, arrays):
+        cube = cls.__new__(cls)
+        cube.ratings = {rating: code + 1 for code, rating in enumerate(state['ratings'])}
+        cube.plazos = {plazo: code + 1 for code, plazo in enumerate(state['plazos'])}
+        for name in cls.ARRAYS:
+            setattr(cube, name, arrays[name])
+        return cube
+
+    def cell(self, month_code, calif='Todos', plazo='Todos', min_calif='Todos'):
+        """Return the (month, rating, plazo) index of a cell, or None if it is empty.
+
+        A minimum rating selects a slice of rating slots; they follow the
+        rating scale, so the ratings at least that good are contiguous.
+        """
+        rating_slot = 0 if calif in (None, 'Todos') else self.ratings.get(calif)
+        plazo_slot = 0 if plazo in (None, 'Todos') else self.plazos.get(plazo)
+        if month_code is None or rating_slot is None or plazo_slot is None:
+            return None
+        if min_calif not in (None, 'Todos'):
+            limit = rating_limit(list(self.ratings), min_calif)
+            if rating_slot == 0:
+                rating_slot = slice(1, limit + 1)
+            elif rating_slot > limit:
+                return None
+        return month_code, rating_slot, plazo_slot
+
+    def kpis(self, month_code, calif='Todos', plazo='Todos', min_calif='Todos'):
+        """Return count, mean, max, min and nunique for one cell or rating range"""
+        cell = self.cell(month_code, calif, plazo, min_calif)
+        count = 0 if cell is None else int(self.count[cell].sum())
+        if count == 0:
+            return {'count': 0, 'mean': np.nan, 'max': np.nan, 'min': np.nan, 'nunique': 0}
+        rated = int(self.rated[cell].sum())
+        if isinstance(cell[1], slice):
+            # Entities present under any rating of the range
+            nunique = int(np.unpackbits(np.bitwise_or.reduce(self.entities[cell], axis=0)).sum())
+        else:
+            nunique = int(self.nunique[cell])
+        return {
+            'count': count,
+            'mean': self.total[cell].sum() / rated if rated else np.nan,
+            'max': self.high[cell].max() if rated else np.nan,
+            'min': self.low[cell].min() if rated else np.nan,
+            'nunique': nunique,
+        }
+
+
+class TrendArray:
+    """Dense mean rate per (entity, plazo, mes), built once at load.
+
+    ``values[entity_code, plazo_code]`` is the monthly history of one
+    offer, NaN for months without it, so a trend query is a slice instead
+    of a groupby over the whole history. Entity codes are those of the
+    ``razon_social`` categories. The sums are accumulated ``block_rows``
+    rows at a time.
+    """
+
+    def __init__(self, df, n_months, block_rows=CHUNK_ROWS):
+        self.entities = {name: code for code, name in enumerate(df['razon_social'].cat.categories)}
+        plazos = sorted_plazos(df['plazo'], block_rows)
+        self.plazos = {plazo: code for code, plazo in enumerate(plazos)}
+        shape = (len(self.entities), len(self.plazos), n_months)
+        size = int(np.prod(shape))
+
+        count = np.zeros(size, dtype=np.int64)
+        total = np.zeros(size)
+        plazo_index = pd.Index(plazos)
+        mes_codes = df['mes'].cat.codes.to_numpy()
+        entity_codes = df['razon_social'].cat.codes.to_numpy()
+        plazo_values = df['plazo'].to_numpy()
+        rate_values = df['tasa_pasiva_efectiva'].to_numpy()
+        for block in row_blocks(len(df), block_rows):
+            block_entities = entity_codes[block]
+            plazo_codes = plazo_index.get_indexer(plazo_values[block])
+            rates = rate_values[block].astype(np.float64)
+            keep = (block_entities >= 0) & (plazo_codes >= 0) & ~np.isnan(rates)
+            cells = np.ravel_multi_index(
+                (block_entities[keep], plazo_codes[keep], mes_codes[block][keep]), shape
+            )
+            count += np.bincount(cells, minlength=size)
+            total += np.bincount(cells, weights=rates[keep], minlength=size)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.values = (total / count).astype(np.float32).reshape(shape)
+
+    def to_snapshot(self):
+        """Return the JSON state and the arrays of this trend array"""
+        return {'entities': list(self.entities), 'plazos': list(self.plazos)}, {'values': self.values}
+
+    @classmethod
+    def from_snapshot(cls, state, arrays):
+        trends = cls.__new__(cls)
+        trends.entities = {name: code for code, name in enumerate(state['entities'])}
+        trends.plazos = {plazo: code for code, plazo in enumerate(state['plazos'])}
+        trends.values = arrays['values']
+        return trends
+
+    def series(self, entity, plazo):
+        """Return the monthly mean rates of one (entity, plazo), or None if unknown"""
+        entity_code = self.entities.get(entity)
+        plazo_code = self.plazos.get(plazo)
+        if entity_code is None or plazo_code is None:
+            return None
+        return self.values[entity_code, plazo_code]
+
+
+class RateDeltas:
+    """Change of every offer's rate against the previous month and 12 months earlier.
+
+    Built once at load with a single keyed alignment: each row looks up
+    its own (entity, plazo) cell of the trend array at the earlier month,
+    so no request ever merges months. ``values[column][row]`` is NaN when
+    the offer did not exist at that month. The columns are filled
+    ``block_rows`` rows at a time into arrays from ``allocate``.
+    """
+
+    # Delta column -> how many calendar months back it compares against
+    LAGS = {'delta_mes': 1, 'delta_anual': 12}
+
+    def __init__(self, df, trends, block_rows=CHUNK_ROWS, allocate=None):
+        allocate = allocate or allocate_in_memory
+        months = df['mes'].cat.categories
+        try:
+            ordinals = pd.PeriodIndex(months, freq='M').asi8
+        except (ValueError, TypeError):
+            # Not calendar months: compare against the previous partitions
+            ordinals = np.arange(len(months))
+        month_code = {ordinal: code for code, ordinal in enumerate(ordinals)}
+        earlier = {
+            column: np.array([month_code.get(ordinal - lag, -1) for ordinal in ordinals], dtype=np.intp)
+            for column, lag in self.LAGS.items()
+        }
+
+        plazo_index = pd.Index(list(trends.plazos))
+        mes_codes = df['mes'].cat.codes.to_numpy()
+        entity_codes = df['razon_social'].cat.codes.to_numpy()
+        plazo_values = df['plazo'].to_numpy()
+        rate_values = df['tasa_pasiva_efectiva'].to_numpy()
+        self.values = {column: allocate(column, len(df), np.float32) for column in self.LAGS}
+        for block in row_blocks(len(df), block_rows):
+            block_mes = mes_codes[block]
+            block_entities = entity_codes[block]
+            plazo_codes = plazo_index.get_indexer(plazo_values[block])
+            rates = rate_values[block].astype(np.float32)
+            keep = (block_entities >= 0) & (plazo_codes >= 0)
+            for column, values in self.values.items():
+                earlier_rows = earlier[column][block_mes]
+                valid = keep & (earlier_rows >= 0)
+                delta = np.full(len(block_mes), np.nan, dtype=np.float32)
+                delta[valid] = rates[valid] - trends.values[
+                    block_entities[valid], plazo_codes[valid], earlier_rows[valid]
+                ]
+                values[block] = delta
+
+    def to_snapshot(self):
+        """Return the JSON state and the arrays of these deltas"""
+        return {}, dict(self.values)
+
+    @classmethod
+    def from_snapshot(cls, state, arrays):
+        deltas = cls.__new__(cls)
+        deltas.values = {column: arrays[column] for column in cls.LAGS}
+        return deltas
+
+    def take(self, rows):
+        """Return the delta columns of ``rows`` by name"""
+        return {column: values[rows] for column, values in self.values.items()}
+
+
+# Rate change columns added to the offers table
+DELTA_COLUMNS = list(RateDeltas.LAGS)
+
+
+def normalize_text(text):
+    """Casefold ``text`` and strip its accents ('CRÉDITO' -> 'credito')"""
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+class SearchIndex:
+    """Accent- and case-insensitive substring index over entity names.
+
+    Each unique name is normalized once and indexed by its character
+    trigrams, so a query only verifies the names sharing all of its
+    trigrams. Row positions are grouped by (month, entity) in CSR form, so
+    expanding the matching entities to rows costs time proportional to the
+    rows returned rather than to the size of the month. The row lists are
+    filled ``block_rows`` rows at a time into an array from ``allocate``.
+    """
+
+    NGRAM = 3
+
+    def __init__(self, names, mes_codes, entity_codes, n_months, block_rows=CHUNK_ROWS, allocate=None):
+        allocate = allocate or allocate_in_memory
+        self.names = [normalize_text(name) for name in names]
+        self.n_entities = len(self.names)
+
+        postings = {}
+        for code, name in enumerate(self.names):
+            for gram in ngrams(name, self.NGRAM):
+                postings.setdefault(gram, set()).add(code)
+        self.postings = {gram: np.array(sorted(codes), dtype=np.int32) for gram, codes in postings.items()}
+
+        # Rows with a missing entity (code -1) can never match a search
+        n_keys = n_months * self.n_entities
+        counts = np.zeros(n_keys, dtype=np.int64)
+        for block in row_blocks(len(mes_codes), block_rows):
+            counts += np.bincount(self._keys(mes_codes[block], entity_codes[block])[1], minlength=n_keys)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+        # Counting sort: every block's rows go after those of earlier blocks
+        # with the same key, in row order
+        self.row_order = allocate('row_order', int(self.offsets[-1]), np.intp)
+        next_slot = self.offsets[:-1].copy()
+        for block in row_blocks(len(mes_codes), block_rows):
+            rows, keys = self._keys(mes_codes[block], entity_codes[block])
+            order = np.argsort(keys, kind='stable')
+            keys = keys[order]
+            rank = np.arange(len(keys)) - np.searchsorted(keys, keys)
+            self.row_order[next_slot[keys] + rank] = rows[order] + block.start
+            next_slot += np.bincount(keys, minlength=n_keys)
+
+    def _keys(self, mes_codes, entity_codes):
+        # Positions and (month, entity) keys of the rows with an entity
+        rows = np.flatnonzero(entity_codes >= 0)
+        return rows, mes_codes[rows].astype(np.int64) * self.n_entities + entity_codes[rows]
+
+    def to_snapshot(self):
+        """Return the JSON state and the arrays of this index"""
+        grams = list(self.postings)
+        lengths = [len(self.postings[gram]) for gram in grams]
+        arrays = {
+            'posting_codes': np.concatenate([self.postings[gram] for gram in grams] or [np.empty(0, np.int32)]),
+            'posting_offsets': np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]),
+            'row_order': self.row_order,
+            'offsets': self.offsets,
+        }
+        return {'names': self.names, 'grams': grams}, arrays
+
+    @classmethod
+    def from_snapshot(cls, state, arrays):
+        index = cls.__new__(cls)
+        index.names = state['names']
+        index.n_entities = len(index.names)
+        codes, bounds = arrays['posting_codes'], arrays['posting_offsets']
+        index.postings = {
+            gram: codes[bounds[i]:bounds[i + 1]] for i, gram in enumerate(state['grams'])
+        }
+        index.row_order = arrays['row_order']
+        index.offsets = arrays['offsets']
+        return index
+
+    def match(self, text):
+        """Return the codes of the entities whose name contains ``text``"""
+        query = normalize_text(text).strip()
+        if len(query) < self.NGRAM:
+            # Too short for the trigram index; the set of names is small
+            candidates = range(self.n_entities)
+        else:
+            lists = [self.postings.get(gram) for gram in set(ngrams(query, self.NGRAM))]
+            if any(codes is None for codes in lists):
+                return np.empty(0, dtype=np.int32)
+            lists.sort(key=len)
+            candidates = lists[0]
+            for codes in lists[1:]:
+                candidates = np.intersect1d(candidates, codes, assume_unique=True)
+        return np.array([code for code in candidates if query in self.names[code]], dtype=np.int32)
+
+    def rows(self, month_code, entities):
+        """Return the sorted row positions of ``entities`` within month ``month_code``"""
+        base = month_code * self.n_entities
+        parts = [self.row_order[self.offsets[base + code]:self.offsets[base + code + 1]] for code in entities]
+        if not parts:
+            return np.empty(0, dtype=np.intp)
+        return np.sort(np.concatenate(parts))
+
+
+# Derived index classes saved in snapshots, by name
+INDEX_TYPES = {'search': SearchIndex, 'cube': AggregateCube, 'trends': TrendArray, 'deltas': RateDeltas}
+
+
+def build_indexes(df, n_months, block_rows=CHUNK_ROWS, allocate=None):
+    """Build the derived indexes of month-partitioned ``df``, by name.
+
+    Rows are processed ``block_rows`` at a time, so the temporaries follow
+    the block size rather than the length of ``df``. The arrays holding one
+    value per row come from ``allocate(name, key, length, dtype)``; by
+    default they live in memory.
+    """
+    def for_index(name):
+        return None if allocate is None else functools.partial(allocate, name)
+
+    search = SearchIndex(
+        df['razon_social'].cat.categories,
+        df['mes'].cat.codes.to_numpy(),
+        df['razon_social'].cat.codes.to_numpy(),
+        n_months,
+        block_rows,
+        for_index('search'),
+    )
+    cube = AggregateCube(df, n_months, block_rows)
+    trends = TrendArray(df, n_months, block_rows)
+    deltas = RateDeltas(df, trends, block_rows, for_index('deltas'))
+    return {'search': search, 'cube': cube, 'trends': trends, 'deltas': deltas}
+
+
+def allocate_in_memory(key, length, dtype):
+    return np.empty(length, dtype=dtype)
+
+
+def row_blocks(n_rows, block_rows):
+    """Yield the slices covering ``n_rows`` rows ``block_rows`` at a time"""
+    for start in range(0, n_rows, block_rows):
+        yield slice(start, min(start + block_rows, n_rows))
+
+
+def sorted_plazos(plazo, block_rows=CHUNK_ROWS):
+    """Return the distinct non-missing values of ``plazo`` in ascending order"""
+    values = set()
+    for block in row_blocks(len(plazo), block_rows):
+        values.update(pd.unique(plazo.iloc[block]).tolist())
+    return sorted(value for value in values if value == value)
+
+
+def ngrams(text, n):
+    """Yield the character n-grams of ``text``"""
+    for i in range(len(text) - n + 1):
+        yield text[i:i + n]
+
+
+def build_month_index(mes):
+    """Return the sorted month labels and their (start, stop) row ranges.
+
+    ``mes`` must be an ordered categorical already sorted by month.
+    """
+    codes = mes.cat.codes.to_numpy()
+    months = list(mes.cat.categories)
+    starts = np.searchsorted(codes, np.arange(len(months)), side='left')
+    stops = np.searchsorted(codes, np.arange(len(months)), side='right')
+    ranges = {
+        month: (int(start), int(stop))
+        for month, start, stop in zip(months, starts, stops)
+        if stop > start
+    }
+    return [month for month in months if month in ranges], ranges
+
+
+def file_version(path):
+    """Return a short key for ``path`` based on its mtime and size"""
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def content_version(path, size=None):
+    """Return the version key of ``path``: a hash of its (first ``size`` bytes of) contents"""
+    digest = hashlib.sha1()
+    remaining = os.path.getsize(path) if size is None else size
+    with open(path, 'rb') as f:
+        while remaining > 0:
+            block = f.read(min(remaining, 1024 * 1024))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()[:16]
+
+
+def source_info(path, size=None):
+    """Return the size and tail fingerprint of the first ``size`` bytes of ``path``"""
+    if size is None:
+        size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        f.seek(max(0, size - TAIL_BYTES))
+        tail = f.read(min(size, TAIL_BYTES))
+    return {'size': size, 'tail': hashlib.sha1(tail).hexdigest()}
+
+
+def snapshot_path(path):
+    """Return the directory holding the binary snapshot of CSV ``path``"""
+    return os.path.splitext(path)[0] + '.snapshot'
+
+
+def load_dataset(path, previous=None):
+    """Return a typed Dataset for the tasas CSV at ``path``.
+
+    The typed columns and derived indexes are memory-mapped from the
+    binary snapshot when it was built from the same CSV contents, so every
+    process serving that snapshot shares one copy of the data through the
+    page cache. Otherwise the snapshot is rebuilt (incrementally from
+    ``previous`` when given) while holding a file lock: one process parses
+    the CSV and the others wait and then map its result.
+    """
+    dataset = open_snapshot(path)
+    if dataset is not None:
+        return dataset
+
+    with snapshot_lock(path):
+        # Another process may have built the snapshot while we waited
+        dataset = open_snapshot(path)
+        if dataset is not None:
+            return dataset
+        if previous is not None:
+            return update_dataset(previous, path)
+        return ingest_csv(path)
+
+
+def open_snapshot(path):
+    """Return the Dataset mapped from the snapshot of ``path``, or None if it is missing or stale.
+
+    A snapshot is current when it was built from the same bytes. The
+    file's mtime and size are checked first; only when they differ (the
+    file was touched or copied) are its contents hashed.
+    """
+    snapshot = snapshot_path(path)
+    try:
+        meta = read_meta(snapshot)
+        if meta.get('format') != SNAPSHOT_FORMAT:
+            return None
+        stat = file_version(path)
+        if meta.get('stat') != stat:
+            if meta['version'] != content_version(path):
+                return None
+            # Same contents: remember the new stat so the next check is cheap
+            meta['stat'] = stat
+            try:
+                write_meta(snapshot, meta)
+            except OSError:
+                pass
+        df = load_columns(snapshot, meta, mmap_mode='r')
+        indexes = load_indexes(snapshot, meta, mmap_mode='r')
+    except (OSError, ValueError, KeyError):
+        # Missing or unreadable snapshot (e.g. from an older layout)
+        return None
+    return Dataset(df, meta['version'], meta.get('source'), stat, indexes)
+
+
+@contextlib.contextmanager
+def snapshot_lock(path):
+    """Hold an exclusive lock while the snapshot of ``path`` is being built"""
+    try:
+        lock_file = open(snapshot_path(path) + '.lock', 'a')
+    except OSError:
+        lock_file = None
+    if fcntl is None or lock_file is None:
+        yield
+        return
+    with lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def ingest_csv(path, chunksize=CHUNK_ROWS):
+    """Stream the tasas CSV into its binary snapshot and return the Dataset.
+
+    The CSV is read ``chunksize`` rows at a time (see ``build_snapshot``),
+    so the whole history never has to fit in memory. If the snapshot
+    cannot be written, the CSV is parsed in memory instead.
+    """
+    stat = file_version(path)
+    version = content_version(path)
+    source = source_info(path)
+    return snapshot_dataset(
+        path, csv_chunks(path, chunksize), version, source, stat, chunksize,
+        in_memory=lambda: typed_frame(read_tasas_csv(path))
+    )
+
+
+def snapshot_dataset(path, chunks, version, source, stat, chunksize, in_memory):
+    """Build the snapshot of ``path`` from ``chunks`` and return its Dataset.
+
+    If the snapshot cannot be written, the Dataset is built from the typed
+    frame ``in_memory()`` returns instead.
+    """
+    try:
+        return build_snapshot(chunks, snapshot_path(path), version, source, stat, chunksize)
+    except OSError:
+        # A read-only data directory only costs us the shared, faster start
+        return Dataset(in_memory(), version, source, stat)
+
+
+def csv_chunks(path, chunksize=CHUNK_ROWS):
+    """Yield the tasas CSV at ``path`` ``chunksize`` rows at a time; a header-only file yields one empty frame"""
+    empty = True
+    with read_tasas_csv(path, chunksize=chunksize) as reader:
+        for chunk in reader:
+            empty = False
+            yield chunk
+    if empty:
+        yield read_tasas_csv(path, nrows=0)
+
+
+def read_tasas_csv(source, **kwargs):
+    """``pd.read_csv`` restricted to the columns the apps use"""
+    return pd.read_csv(
+        source,
+        usecols=lambda col: col in CSV_COLUMNS,
+        dtype={col: str for col in CATEGORY_COLUMNS},
+        **kwargs
+    )
+
+
+def update_dataset(dataset, path, chunksize=CHUNK_ROWS):
+    """Return a Dataset for the changed CSV at ``path``.
+
+    When the file only grew and its previous contents are unchanged, just
+    the appended rows are parsed and merged into ``dataset``; any other
+    change falls back to a full ingestion.
+
+    Only whole appended lines are merged. The new dataset covers the file
+    up to its last newline, and its version is the hash of that prefix. A
+    row still being written is picked up on a later check; until one is
+    complete, ``dataset`` itself is returned.
+
+    The previous columns are fed to ``build_snapshot`` block by block
+    followed by the new rows, so the merge is bounded by ``chunksize``
+    like a full ingestion. Only when the snapshot cannot be written is the
+    history merged in memory (``append_rows``).
+    """
+    stat = file_version(path)
+    old_source = dataset.source
+    new_size = os.path.getsize(path)
+    if (old_source is None
+            or new_size <= old_source['size']
+            or source_info(path, old_source['size'])['tail'] != old_source['tail']):
+        return ingest_csv(path)
+
+    with open(path, 'rb') as f:
+        header = f.readline()
+        f.seek(old_source['size'] - 1)
+        appended = f.read(new_size - old_source['size'] + 1)
+    if not appended.startswith(b'\n'):
+        # The previous contents ended mid-line, so a row may be split
+        return ingest_csv(path)
+    end = appended.rfind(b'\n')
+    if end == 0:
+        return dataset
+    size = old_source['size'] + end
+    new_source = source_info(path, size)
+    version = content_version(path, size)
+    new_rows = read_tasas_csv(io.BytesIO(header + appended[1:end + 1]))
+
+    def chunks():
+        for block in row_blocks(len(dataset.df), chunksize):
+            yield dataset.df.iloc[block]
+        yield new_rows
+
+    return snapshot_dataset(
+        path, chunks(), version, new_source, stat, chunksize,
+        in_memory=lambda: append_rows(dataset.df, typed_frame(new_rows))
+    )
+
+
+def append_rows(df, new_rows):
+    """Append typed ``new_rows`` to ``df``, re-partitioning by month.
+
+    Categorical columns are merged with ``union_categoricals`` so existing
+    codes are reused instead of re-hashing every string of the history.
+    Every column of the history is copied into memory and re-sorted, so
+    this is only the fallback for a data directory that cannot hold a
+    snapshot.
+    """
+    columns = {}
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            columns[col] = union_categoricals(
+                [df[col], new_rows[col].astype('category')], ignore_order=True
+            )
+        else:
+            columns[col] = pd.concat([df[col], new_rows[col]], ignore_index=True)
+    return typed_frame(pd.DataFrame(columns))
+
+
+def partition_by_month(df):
+    """Sort rows by month and store ``mes`` as an ordered categorical.
+
+    Rows without a month belong to no partition and are dropped.
+    """
+    if df['mes'].isna().any():
+        df = df[df['mes'].notna()]
+    mes = df['mes']
+    if isinstance(mes.dtype, pd.CategoricalDtype):
+        mes = mes.cat.set_categories(sorted(mes.cat.categories), ordered=True)
+    else:
+        mes = mes.astype(str)
+        mes = pd.Categorical(mes, categories=sorted(mes.unique()), ordered=True)
+    df = df.assign(mes=mes)
+    return df.sort_values('mes', kind='stable').reset_index(drop=True)
+
+
+def rating_categories(ratings):
+    """Return ``ratings`` in scale order, unknown ratings last in alphabetical order"""
+    return sorted(ratings, key=lambda cal: (RATING_RANK.get(cal, len(RATING_RANK)), cal))
+
+
+def rating_limit(categories, min_calif):
+    """Return how many of the scale-ordered ``categories`` are rated at least ``min_calif``.
+
+    A minimum outside the scale matches nothing.
+    """
+    rank = RATING_RANK.get(min_calif)
+    if rank is None:
+        return 0
+    return bisect.bisect_right([RATING_RANK.get(cal, len(RATING_RANK)) for cal in categories], rank)
+
+
+def order_ratings(series):
+    """Return ``series`` as an ordered categorical following the rating scale"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.reorder_categories(rating_categories(series.cat.categories), ordered=True)
+    return series.astype(pd.CategoricalDtype(rating_categories(series.dropna().unique()), ordered=True))
+
+
+def typed_frame(df):
+    """Return ``df`` partitioned by month with compact column dtypes.
+
+    Entity and any other text columns become categoricals, the rating an
+    ordered one on the rating scale, ``plazo`` is stored as int16 and
+    ``tasa_pasiva_efectiva`` as float32.
+    """
+    df = partition_by_month(df)
+    columns = {}
+    for col in df.columns:
+        if col == 'mes':
+            continue
+        if col == 'ULTIMA_CALIFICACIÓN':
+            columns[col] = order_ratings(df[col])
+        elif col == 'tasa_pasiva_efectiva':
+            columns[col] = df[col].astype(np.float32)
+        elif col == 'plazo':
+            columns[col] = downcast_int16(df[col])
+        elif not isinstance(df[col].dtype, pd.CategoricalDtype) and pd.api.types.is_string_dtype(df[col]):
+            columns[col] = df[col].astype('category')
+    return df.assign(**columns)
+
+
+def downcast_int16(series):
+    """Store whole-number ``series`` as int16 when its values fit"""
+    if series.isna().any() or not pd.api.types.is_numeric_dtype(series):
+        return series
+    info = np.iinfo(np.int16)
+    if series.min() >= info.min and series.max() <= info.max and (series % 1 == 0).all():
+        return series.astype(np.int16)
+    return series
+
+
+def write_snapshot(dataset, directory):
+    """Write ``dataset`` as one .npy file per column and index array plus a meta.json.
+
+    Categorical columns are stored as their integer codes with the
+    categories kept in meta.json. The directory is swapped in atomically so
+    readers never see a half-written snapshot.
+    """
+    parent = os.path.dirname(os.path.abspath(directory))
+    tmp_dir = tempfile.mkdtemp(prefix='.snapshot-', dir=parent)
+    try:
+        columns = []
+        for i, col in enumerate(dataset.df.columns):
+            series = dataset.df[col]
+            entry = {'name': col, 'file': f"c{i}.npy"}
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                entry['kind'] = 'category'
+                entry['categories'] = series.cat.categories.tolist()
+                entry['ordered'] = bool(series.cat.ordered)
+                values = series.cat.codes.to_numpy()
+            else:
+                entry['kind'] = 'numeric'
+                values = series.to_numpy()
+            np.save(os.path.join(tmp_dir, entry['file']), values, allow_pickle=False)
+            columns.append(entry)
+
+        publish_snapshot(tmp_dir, directory, {
+            'format': SNAPSHOT_FORMAT,
+            'version': dataset.version,
+            'stat': dataset.stat,
+            'source': dataset.source,
+            'rows': len(dataset),
+            'columns': columns,
+            'indexes': write_indexes(tmp_dir, dataset.indexes),
+        })
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def publish_snapshot(tmp_dir, directory, meta):
+    """Write meta.json into the finished ``tmp_dir`` and swap it in as ``directory``"""
+    # meta.json is written last: its presence marks a complete snapshot
+    write_meta(tmp_dir, meta)
+
+    parent = os.path.dirname(os.path.abspath(directory))
+    old_dir = None
+    if os.path.exists(directory):
+        old_dir = tempfile.mkdtemp(prefix='.snapshot-old-', dir=parent)
+        os.replace(directory, os.path.join(old_dir, 'snapshot'))
+    os.replace(tmp_dir, directory)
+    if old_dir is not None:
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def write_meta(directory, meta):
+    """Atomically (re)write the meta.json of a snapshot directory"""
+    fd, tmp_path = tempfile.mkstemp(prefix='.meta-', suffix='.json', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(directory, 'meta.json'))
+    except OSError:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_indexes(directory, indexes):
+    """Save the derived ``indexes`` into ``directory``; returns their meta entries"""
+    entries = {}
+    for name, index in indexes.items():
+        state, arrays = index.to_snapshot()
+        files = {}
+        for key, values in arrays.items():
+            files[key] = index_file(name, key)
+            target = os.path.join(directory, files[key])
+            if isinstance(values, np.memmap) and values.filename == os.path.abspath(target):
+                # Filled in place by build_indexes (see index_allocator)
+                values.flush()
+                continue
+            np.save(target, values, allow_pickle=False)
+        entries[name] = {'state': state, 'files': files}
+    return entries
+
+
+def index_file(name, key):
+    return f"{name}.{key}.npy"
+
+
+def index_allocator(directory):
+    """Return an ``allocate`` for ``build_indexes`` that maps each array to its file in ``directory``"""
+    def allocate(name, key, length, dtype):
+        if length == 0:
+            # Empty arrays cannot be memory-mapped
+            return np.empty(0, dtype=dtype)
+        target = os.path.join(directory, index_file(name, key))
+        return np.lib.format.open_memmap(target, mode='w+', dtype=dtype, shape=(length,))
+    return allocate
+
+
+def build_snapshot(chunks, directory, version, source=None, stat=None, chunksize=CHUNK_ROWS):
+    """Stream ``chunks`` of tasas rows into a snapshot and return its Dataset.
+
+    ``chunks`` yields at least one frame, raw CSV rows (``csv_chunks``) or
+    typed ones. Each chunk is typed, sorted by month and spilled to scratch
+    files. The snapshot columns are then assembled month by month, so peak
+    memory follows ``chunksize`` rather than the size of the file. The
+    columns are the ones ``write_snapshot`` would write for ``typed_frame``
+    of all the rows. The derived indexes are built from the mapped columns
+    ``chunksize`` rows at a time, their per-row arrays written straight to
+    the snapshot.
+    """
+    parent = os.path.dirname(os.path.abspath(directory))
+    tmp_dir = tempfile.mkdtemp(prefix='.snapshot-', dir=parent)
+    try:
+        spill = ColumnSpill(tmp_dir)
+        for chunk in chunks:
+            spill.append(chunk)
+        meta = {
+            'format': SNAPSHOT_FORMAT,
+            'version': version,
+            'stat': stat,
+            'source': source,
+            'rows': spill.rows,
+            'columns': spill.write_columns(tmp_dir),
+        }
+        df = load_columns(tmp_dir, meta, mmap_mode='r')
+        indexes = build_indexes(df, len(df['mes'].cat.categories), chunksize, index_allocator(tmp_dir))
+        meta['indexes'] = write_indexes(tmp_dir, indexes)
+        # The mapped files stay valid once the directory is renamed
+        dataset = Dataset(df, version, source, stat, load_indexes(tmp_dir, meta, mmap_mode='r'))
+        publish_snapshot(tmp_dir, directory, meta)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return dataset
+
+
+class ColumnSpill:
+    """Month-sorted chunks of the tasas CSV, spilled to one scratch file per column.
+
+    Chunks are raw CSV rows or typed ones, such as blocks of a previous
+    snapshot's columns. Categorical values get int32 codes in order of
+    first appearance. Every chunk is stably sorted by month, and the
+    position of each month's run is remembered. ``write_columns`` then
+    copies the runs out month by month, remapping the codes to sorted
+    categories (ratings in scale order).
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.columns = None
+        self.dtypes = {}
+        self.codes = {}
+        self.runs = []
+        self.rows = 0
+        self.plazo_integral = True
+        self.plazo_int16 = True
+        self._files = {}
+
+    def _spill_path(self, col):
+        return os.path.join(self.directory, f"spill-{self.columns.index(col)}.bin")
+
+    def append(self, chunk):
+        """Type, sort and spill one chunk of CSV rows; rows without a month are dropped"""
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+            for col in self.columns:
+                if col in CATEGORY_COLUMNS:
+                    self.codes[col] = {}
+                    self.dtypes[col] = np.int32
+                elif col == 'tasa_pasiva_efectiva':
+                    self.dtypes[col] = np.float32
+                else:
+                    self.dtypes[col] = np.float64
+                self._files[col] = open(self._spill_path(col), 'wb')
+
+        # Like partition_by_month; a missing month would code as -1
+        chunk = chunk[chunk['mes'].notna()]
+        arrays = {}
+        for col in self.columns:
+            if col in self.codes:
+                values = chunk[col]
+                if col == 'mes' and not isinstance(values.dtype, pd.CategoricalDtype):
+                    values = values.astype(str)
+                arrays[col] = encode_categories(values, self.codes[col])
+            else:
+                arrays[col] = chunk[col].to_numpy(dtype=self.dtypes[col])
+        if 'plazo' in arrays:
+            self._check_plazo(arrays['plazo'])
+
+        order = np.argsort(arrays['mes'], kind='stable')
+        for col in self.columns:
+            arrays[col][order].tofile(self._files[col])
+
+        mes = arrays['mes'][order]
+        starts = np.flatnonzero(np.diff(mes, prepend=-1))
+        stops = np.append(starts[1:], len(mes))
+        for start, stop in zip(starts, stops):
+            self.runs.append((int(mes[start]), self.rows + int(start), self.rows + int(stop)))
+        self.rows += len(mes)
+
+    def _check_plazo(self, values):
+        # Mirrors downcast_int16 over the whole column
+        if len(values) == 0:
+            return
+        integral = not np.isnan(values).any() and bool((values % 1 == 0).all())
+        self.plazo_integral &= integral
+        info = np.iinfo(np.int16)
+        self.plazo_int16 &= integral and values.min() >= info.min and values.max() <= info.max
+
+    def _final_dtype(self, col):
+        if col in self.codes:
+            # Same code width pandas picks for this many categories
+            for dtype in (np.int8, np.int16, np.int32):
+                if len(self.codes[col]) < np.iinfo(dtype).max:
+                    return np.dtype(dtype)
+            return np.dtype(np.int64)
+        if col == 'plazo' and self.plazo_integral:
+            return np.dtype(np.int16) if self.plazo_int16 else np.dtype(np.int64)
+        return np.dtype(self.dtypes[col])
+
+    def write_columns(self, directory):
+        """Assemble the month-sorted snapshot columns into ``directory``; returns their meta entries"""
+        for f in self._files.values():
+            f.close()
+
+        remaps = {}
+        categories = {}
+        for col, codes in self.codes.items():
+            if col == 'ULTIMA_CALIFICACIÓN':
+                categories[col] = rating_categories(codes)
+            else:
+                categories[col] = sorted(codes)
+            rank = {value: i for i, value in enumerate(categories[col])}
+            # The trailing -1 maps missing values (code -1) to themselves
+            remaps[col] = np.array([rank[value] for value in codes] + [-1], dtype=np.int32)
+
+        # Calendar order of months; runs of one month keep their file order
+        mes_rank = remaps['mes']
+        runs = sorted(self.runs, key=lambda run: mes_rank[run[0]])
+
+        entries = []
+        for i, col in enumerate(self.columns):
+            entry = {'name': col, 'file': f"c{i}.npy"}
+            dtype = self._final_dtype(col)
+            target = os.path.join(directory, entry['file'])
+            if self.rows == 0:
+                np.save(target, np.empty(0, dtype=dtype), allow_pickle=False)
+            else:
+                spilled = np.memmap(self._spill_path(col), dtype=self.dtypes[col], mode='r', shape=(self.rows,))
+                out = np.lib.format.open_memmap(target, mode='w+', dtype=dtype, shape=(self.rows,))
+                pos = 0
+                for _, start, stop in runs:
+                    block = spilled[start:stop]
+                    if col in remaps:
+                        block = remaps[col][block]
+                    out[pos:pos + stop - start] = block
+                    pos += stop - start
+                out.flush()
+                del out, spilled
+            os.remove(self._spill_path(col))
+
+            if col in self.codes:
+                entry['kind'] = 'category'
+                entry['categories'] = categories[col]
+                entry['ordered'] = col in ('mes', 'ULTIMA_CALIFICACIÓN')
+            else:
+                entry['kind'] = 'numeric'
+            entries.append(entry)
+        return entries
+
+
+def encode_categories(values, codes):
+    """Return the int32 codes of ``values`` in ``codes`` (value -> code), adding new values"""
+    categorical = pd.Categorical(values)
+    lookup = np.array(
+        [codes.setdefault(value, len(codes)) for value in categorical.categories] + [-1], dtype=np.int32
+    )
+    return lookup[categorical.codes]
+
+
+def read_meta(directory):
+    with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_columns(directory, meta, mmap_mode=None):
+    """Return the DataFrame of the snapshot columns described by ``meta``"""
+    columns = {}
+    for entry in meta['columns']:
+        values = load_array(os.path.join(directory, entry['file']), mmap_mode)
+        if entry['kind'] == 'category':
+            categories = entry['categories']
+            if len(values) and (values.min() < -1 or values.max() >= len(categories)):
+                raise ValueError(f"Snapshot {directory} has invalid codes for {entry['name']}")
+            # Codes were checked above; skipping pandas' validation avoids a copy
+            dtype = pd.CategoricalDtype(categories, ordered=entry['ordered'])
+            values = pd.Categorical.from_codes(values, dtype=dtype, validate=False)
+        columns[entry['name']] = values
+    df = pd.DataFrame(columns, copy=False)
+    if len(df) != meta['rows']:
+        raise ValueError(f"Snapshot {directory} is incomplete")
+    return df
+
+
+def load_indexes(directory, meta, mmap_mode=None):
+    """Return the derived indexes saved in a snapshot, by name"""
+    indexes = {}
+    for name, entry in meta.get('indexes', {}).items():
+        arrays = {
+            key: load_array(os.path.join(directory, file), mmap_mode)
+            for key, file in entry['files'].items()
+        }
+        indexes[name] = INDEX_TYPES[name].from_snapshot(entry['state'], arrays)
+    return indexes
+
+
+def load_array(path, mmap_mode=None):
+    try:
+        return np.load(path, mmap_mode=mmap_mode, allow_pickle=False)
+    except ValueError:
+        # Empty arrays cannot be memory-mapped
+        return np.load(path, allow_pickle=False)
+
+
+class DatasetRegistry:
+    """Per-process registry holding each dataset version exactly once.
+
+    The browser only ever sees the version key; callbacks resolve it back to
+    the in-memory Dataset through ``get``. ``refresh`` swaps in a new version
+    when the CSV changes. Requests that already hold the previous Dataset
+    finish on it, and the last ``keep_versions`` versions stay resolvable.
+    """
+
+    def __init__(self, path, check_interval=30, keep_versions=2):
+        self.path = path
+        self.check_interval = check_interval
+        self.keep_versions = keep_versions
+        self._lock = threading.Lock()
+        self._datasets = {}
+        self._current = None
+        self._checked_at = 0.0
+        self._listeners = []
+
+    def current(self):
+        """Return the current Dataset, loading it on first use"""
+        if self._current is None:
+            with self._lock:
+                if self._current is None:
+                    self._swap(load_dataset(self.path))
+                    self._checked_at = time.monotonic()
+        return self._current
+
+    def refresh(self, force=False):
+        """Reload the dataset if the CSV changed, then return the current one.
+
+        The file is checked at most once every ``check_interval`` seconds and
+        only one thread reloads at a time; everyone else keeps being served
+        the previous version until the new one is swapped in.
+        """
+        dataset = self.current()
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return dataset
+        if not self._lock.acquire(blocking=False):
+            return dataset
+        try:
+            self._checked_at = now
+            if file_version(self.path) != self._current.stat:
+                self._swap(load_dataset(self.path, previous=self._current))
+        except Exception:
+            logger.exception("Failed to reload %s, keeping version %s", self.path, dataset.version)
+        finally:
+            self._lock.release()
+        return self._current
+
+    def _swap(self, dataset):
+        is_new = dataset.version not in self._datasets
+        self._datasets[dataset.version] = dataset
+        while len(self._datasets) > self.keep_versions:
+            del self._datasets[next(iter(self._datasets))]
+        self._current = dataset
+        if is_new:
+            for listener in self._listeners:
+                try:
+                    listener(dataset)
+                except Exception:
+                    logger.exception("Dataset listener %r failed", listener)
+
+    def subscribe(self, listener):
+        """Call ``listener(dataset)`` whenever a new dataset version becomes current.
+
+        Listeners run on the loading thread and should return quickly.
+        """
+        self._listeners.append(listener)
+        if self._current is not None:
+            listener(self._current)
+
+    def loaded(self):
+        """Return the current Dataset if it is already loaded, without loading it"""
+        return self._current
+
+    def load_in_background(self):
+        """Start loading the current Dataset in a daemon thread; returns the thread"""
+        def load():
+            try:
+                self.current()
+            except Exception:
+                logger.exception("Failed to load %s", self.path)
+
+        thread = threading.Thread(target=load, name='tasas-load', daemon=True)
+        thread.start()
+        return thread
+
+    def versions(self):
+        """Return the version keys that ``get`` still resolves, oldest first"""
+        return list(self._datasets)
+
+    def get(self, version):
+        """Return the Dataset for ``version``, falling back to the current one"""
+        dataset = self._datasets.get(version)
+        if dataset is None:
+            dataset = self.current()
+        return dataset
+
+
+registry = DatasetRegistry(url_path)
+
+
+if __name__ == '__main__':
+    # Ingestion step: python tasas_data.py [path/to/tasas.csv]
+    import sys
+
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else url_path
+    dataset = ingest_csv(csv_path)
+    print(f"Wrote {snapshot_path(csv_path)} ({len(dataset):,} rows, version {dataset.version})")
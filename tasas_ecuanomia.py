@@ -1,5 +1,12 @@
+import tempfile
+
 import streamlit as st
-import pandas as pd
+
+from tasas_cache import cache_warmer, get_results, result_cache
+from tasas_data import DatasetRegistry
+from tasas_charts import trend_figure
+from tasas_export import EXPORT_FORMATS, export_filename, export_months, iter_export, parquet_available
+from tasas_query import filter_options, filter_spec, min_calif_options, top_entities, top_movers, trend_series
 
 # Page configuration
 st.set_page_config(
@@ -13,30 +20,187 @@ st.title("📊 Tasas pasivas de todas las entidades financieras")
 
 url_path = "tasas_2024_forward.csv"
 
+# One dataset registry per process, shared by every session; every new
+# dataset version warms the result cache in the background, and results of
+# versions the registry drops are released
+@st.cache_resource
+def get_registry(url_path):
+    registry = DatasetRegistry(url_path)
+    result_cache.follow(registry)
+    registry.subscribe(cache_warmer.warm)
+    return registry
+
+# Display names and formats of the offers table; applied by the grid itself,
+# so the cached table is shown as is
+TABLE_COLUMN_CONFIG = {
+    'razon_social': st.column_config.TextColumn("Entidad"),
+    'ULTIMA_CALIFICACIÓN': st.column_config.TextColumn("Calificación"),
+    'plazo': st.column_config.NumberColumn("Plazo"),
+    'tasa_pasiva_efectiva': st.column_config.NumberColumn("Tasa pasiva", format="%.2f%%"),
+    # Rate changes in percentage points, aligned for every offer at load
+    'delta_mes': st.column_config.NumberColumn("Δ mes anterior", format="%+.2f"),
+    'delta_anual': st.column_config.NumberColumn("Δ 12 meses", format="%+.2f"),
+}
+
 # Load data locally
-@st.cache_data
 def load_data(url_path):
-    """Load data from local file and return DataFrame"""
+    """Return the current month-partitioned Dataset, reloading it when the file changes"""
     try:
-        df = pd.read_csv(url_path)
-        return df
+        return get_registry(url_path).refresh()
     except Exception as e:
         st.error(f"Error loading data: {e}")
         return None
 
+# Filter options per dataset version and month; the dataset itself is not
+# hashed, its version stands for it
+@st.cache_data(max_entries=256)
+def month_options(_dataset, version, mes):
+    return filter_options(_dataset.month(mes))
+
+def render_kpis(result):
+    """KPI cards of the filtered offers"""
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric(
+            label="Tasa Pasiva Efectiva Promedio",
+            value=f"{result.mean:,.2f}"
+        )
+    
+    with col2:
+        st.metric(
+            label="Tasa Pasiva Efectiva Máxima",
+            value=f"{result.max:,.2f}"
+        )
+    
+    with col3:
+        st.metric(
+            label="Tasa Pasiva Efectiva Mínima",
+            value=f"{result.min:,.2f}"
+        )
+    
+    with col4:
+        st.metric(
+            label="Número de Entidades Financieras",
+            value=f"{result.nunique:,}"
+        )
+
+def render_table(result):
+    """Offers table, already sorted by tasa_pasiva_efectiva descending.
+
+    The cached table is shared with other sessions and must not be
+    modified; renaming and the % format are left to the column config.
+    """
+    st.dataframe(
+        result.table,
+        column_config=TABLE_COLUMN_CONFIG,
+        use_container_width=True,
+        height=400,
+        hide_index=True
+    )
+
+# Switching the comparison only reruns this section
+@st.fragment
+def render_movers(dataset, mes, search, calif, plazo, min_calif):
+    """Offers of the current filters whose rate changed the most"""
+    st.header("🔀 Mayores cambios")
+    horizon = st.radio(
+        "Comparar",
+        options=['delta_mes', 'delta_anual'],
+        format_func=lambda col: "Frente al mes anterior" if col == 'delta_mes' else "Frente a 12 meses antes",
+        horizontal=True,
+        label_visibility='collapsed'
+    )
+    movers = top_movers(dataset, filter_spec(mes, search, calif, plazo, min_calif), horizon)
+    st.dataframe(
+        movers,
+        column_config=TABLE_COLUMN_CONFIG,
+        use_container_width=True,
+        hide_index=True
+    )
+
+# Choosing the range or the format only reruns the download section
+@st.fragment
+def render_export(dataset, mes, search, calif, plazo, min_calif):
+    """Download of the filtered offers of one month or a range of months"""
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        desde = st.selectbox(
+            "Desde el mes",
+            options=[m for m in reversed(dataset.months) if m <= mes],
+            index=0
+        )
+    with col2:
+        fmt = st.radio(
+            "Formato",
+            options=['csv', 'parquet'] if parquet_available() else ['csv'],
+            format_func=str.upper,
+            horizontal=True
+        )
+    months = export_months(dataset, mes, desde)
+    
+    def build_export():
+        # Runs on click, off the script thread. Batches go to a temporary
+        # file first, so only the copy Streamlit serves is held in memory
+        with tempfile.TemporaryFile() as output:
+            for chunk in iter_export(dataset, fmt, months, search, calif, plazo, min_calif):
+                output.write(chunk)
+            output.seek(0)
+            return output.read()
+    
+    with col3:
+        st.download_button(
+            "⬇️ Descargar ofertas",
+            data=build_export,
+            file_name=export_filename(fmt, months),
+            mime=EXPORT_FORMATS[fmt][0],
+            on_click='ignore'
+        )
+
+# Only the chart depends on the trend selectors, so changing them reruns
+# this fragment instead of the whole script
+@st.fragment
+def render_trend(dataset):
+    """Rate history per entity and plazo, sliced from the dense trend array"""
+    st.header("📈 Tendencia histórica")
+    # Starts with the best three entities of the latest month at 360 days
+    trend_plazos_options = list(dataset.trends.plazos)
+    default_plazos = [360] if 360 in dataset.trends.plazos else trend_plazos_options[:1]
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        trend_entities = st.multiselect(
+            "Entidades",
+            options=sorted(dataset.trends.entities),
+            default=top_entities(dataset, default_plazos[0]) if default_plazos else []
+        )
+    with col2:
+        trend_plazos = st.multiselect(
+            "Plazos",
+            options=trend_plazos_options,
+            default=default_plazos,
+            format_func=lambda plazo: f"{plazo} días"
+        )
+    st.plotly_chart(
+        trend_figure(dataset.months, trend_series(dataset, trend_entities, trend_plazos)),
+        use_container_width=True
+    )
+
 # Load data
-df = load_data(url_path)
+dataset = load_data(url_path)
 
-if df is not None:
-    # Ensure month column is string format for filtering
-    if 'mes' in df.columns:
-        df['mes'] = df['mes'].astype(str)
+if dataset is not None:
+    # Month selector, latest month first
+    selected_mes = st.sidebar.selectbox(
+        "Mes",
+        options=list(reversed(dataset.months)),
+        index=0
+    )
     
-    # Filter for month == '2025-09'
-    df_filtered = df[df['mes'] == '2025-09'].copy()
+    # Jump straight to the selected month's partition
+    df_filtered = dataset.month(selected_mes)
     
     if len(df_filtered) > 0:
-        st.sidebar.success(f"✅ Filtered {len(df_filtered)} records for month 2025-09")
+        st.sidebar.success(f"✅ Filtered {len(df_filtered)} records for month {selected_mes}")
         
         # Search box for razon_social
         st.sidebar.header("🔍 Filtros")
@@ -46,166 +210,55 @@ if df is not None:
             help="Ingrese texto para buscar en razón social"
         )
         
-        # Dropdown for ULTIMA_CALIFICACION
-        if 'ULTIMA_CALIFICACIÓN' in df_filtered.columns:
-            # Define the order of calificaciones
-            calificaciones_order = [
-                "AAA", "AAA-", "AA+", "AA", "AA-", 
-                "A+", "A", "A-", 
-                "BBB+", "BBB", "BBB-", 
-                "BB+", "BB", "BB-", 
-                "B+", "B", "B-"
-            ]
-            
-            # Get unique calificaciones from data
-            available_calificaciones = df_filtered['ULTIMA_CALIFICACIÓN'].dropna().unique().tolist()
-            
-            # Sort calificaciones according to the predefined order
-            sorted_calificaciones = []
-            for cal in calificaciones_order:
-                if cal in available_calificaciones:
-                    sorted_calificaciones.append(cal)
-            
-            # Add any calificaciones not in the predefined order at the end
-            for cal in available_calificaciones:
-                if cal not in sorted_calificaciones:
-                    sorted_calificaciones.append(cal)
-            
-            # Add "Todos" at the beginning
-            calificaciones = ['Todos'] + sorted_calificaciones
-            
-            selected_calificacion = st.sidebar.selectbox(
-                "Filtrar por Calificación",
-                options=calificaciones,
-                index=0
-            )
-        else:
-            selected_calificacion = 'Todos'
-        
-        # Dropdown for plazo
-        if 'plazo' in df_filtered.columns:
-            # Get unique plazos from data and sort them
-            available_plazos = sorted(df_filtered['plazo'].dropna().unique().tolist())
-            plazos = ['Todos'] + available_plazos
-            
-            selected_plazo = st.sidebar.selectbox(
-                "Filtrar por Plazo",
-                options=plazos,
-                index=0
-            )
-        else:
-            selected_plazo = 'Todos'
+        # Ratings in scale order and sorted plazos of the selected month
+        calificaciones, plazos = month_options(dataset, dataset.version, selected_mes)
         
-        # Apply filters
-        df_filtered_search = df_filtered.copy()
+        # Dropdown for ULTIMA_CALIFICACION
+        selected_calificacion = st.sidebar.selectbox(
+            "Filtrar por Calificación",
+            options=['Todos'] + calificaciones,
+            index=0
+        )
         
-        # Filter by search text
-        if search_text:
-            df_filtered_search = df_filtered_search[
-                df_filtered_search['razon_social'].str.contains(
-                    search_text, 
-                    case=False, 
-                    na=False
-                )
-            ]
+        # Minimum rating: every offer rated at least this well
+        selected_min_calificacion = st.sidebar.selectbox(
+            "Calificación mínima",
+            options=['Todos'] + min_calif_options(calificaciones),
+            index=0,
+            format_func=lambda cal: "Cualquier calificación" if cal == 'Todos' else f"{cal} o mejor"
+        )
         
-        # Filter by calificación
-        if selected_calificacion != 'Todos':
-            df_filtered_search = df_filtered_search[
-                df_filtered_search['ULTIMA_CALIFICACIÓN'] == selected_calificacion
-            ]
+        # Dropdown for plazo
+        selected_plazo = st.sidebar.selectbox(
+            "Filtrar por Plazo",
+            options=['Todos'] + plazos,
+            index=0
+        )
         
-        # Filter by plazo
-        if selected_plazo != 'Todos':
-            df_filtered_search = df_filtered_search[
-                df_filtered_search['plazo'] == selected_plazo
-            ]
+        # Apply filters (cached per dataset version and filter selection)
+        result = get_results(dataset, selected_mes, search_text, selected_calificacion, selected_plazo,
+                             selected_min_calificacion)
         
         # Update sidebar info
-        st.sidebar.info(f"📊 Mostrando {len(df_filtered_search)} de {len(df_filtered)} registros")
+        st.sidebar.info(f"📊 Mostrando {len(result)} de {result.month_rows} registros")
         
         # Main KPI Cards (based on filtered data)
         #st.header("📈 Tasas Pasivas")
-        
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            mean_tasa = df_filtered_search['tasa_pasiva_efectiva'].mean()
-            st.metric(
-                label="Tasa Pasiva Efectiva Promedio",
-                value=f"{mean_tasa:,.2f}"
-            )
-        
-        with col2:
-            max_tasa = df_filtered_search['tasa_pasiva_efectiva'].max()
-            st.metric(
-                label="Tasa Pasiva Efectiva Máxima",
-                value=f"{max_tasa:,.2f}"
-            )
-        
-        with col3:
-            min_tasa = df_filtered_search['tasa_pasiva_efectiva'].min()
-            st.metric(
-                label="Tasa Pasiva Efectiva Mínima",
-                value=f"{min_tasa:,.2f}"
-            )
-        
-        with col4:
-            nunique_razon = df_filtered_search['razon_social'].nunique()
-            st.metric(
-                label="Número de Entidades Financieras",
-                value=f"{nunique_razon:,}"
-            )
+        render_kpis(result)
         
         # Sortable Table
         st.header("📋 Todas las ofertas")
-        
-        # Create table with selected columns
-        table_columns = ['razon_social', 'ULTIMA_CALIFICACIÓN', 'plazo', 'tasa_pasiva_efectiva']
-        
-        # Check if all columns exist
-        missing_cols = [col for col in table_columns if col not in df_filtered_search.columns]
-        if missing_cols:
-            st.warning(f"⚠️ Missing columns: {', '.join(missing_cols)}")
-            available_cols = [col for col in table_columns if col in df_filtered_search.columns]
-            table_df = df_filtered_search[available_cols].copy()
-        else:
-            table_df = df_filtered_search[table_columns].copy()
-        
-        # Round tasa_pasiva_efectiva to 2 decimals
-        if 'tasa_pasiva_efectiva' in table_df.columns:
-            table_df['tasa_pasiva_efectiva'] = table_df['tasa_pasiva_efectiva'].round(2)
-        
-        # Sort by tasa_pasiva_efectiva in descending order
-        if 'tasa_pasiva_efectiva' in table_df.columns:
-            table_df = table_df.sort_values('tasa_pasiva_efectiva', ascending=False)
-        
-        # Format tasa_pasiva_efectiva with % suffix and rename column
-        if 'tasa_pasiva_efectiva' in table_df.columns:
-            table_df['tasa_pasiva_efectiva'] = table_df['tasa_pasiva_efectiva'].apply(lambda x: f"{x:.2f}%")
-            table_df = table_df.rename(columns={'tasa_pasiva_efectiva': 'Tasa pasiva'})
-        
-        # Rename columns
-        column_rename_map = {
-            'razon_social': 'Entidad',
-            'ULTIMA_CALIFICACIÓN': 'Calificación',
-            'plazo': 'Plazo'
-        }
-        table_df = table_df.rename(columns=column_rename_map)
-        
-        # Display sortable table
-        st.dataframe(
-            table_df,
-            use_container_width=True,
-            height=400,
-            hide_index=True
-        )
-        
-        
+        render_table(result)
+        render_export(dataset, selected_mes, search_text, selected_calificacion, selected_plazo,
+                      selected_min_calificacion)
+        render_movers(dataset, selected_mes, search_text, selected_calificacion, selected_plazo,
+                      selected_min_calificacion)
         
     else:
-        st.warning("⚠️ No data found for month '2025-09'")
-        st.info(f"Meses disponibles: {df['mes'].unique() if 'mes' in df.columns else 'N/A'}")
+        st.warning(f"⚠️ No data found for month '{selected_mes}'")
+        st.info(f"Meses disponibles: {', '.join(dataset.months) or 'N/A'}")
+    
+    render_trend(dataset)
 else:
     st.error("❌ Failed to load data. Please check the file path.")
 
@@ -1,32 +1,89 @@
 import dash
-from dash import dcc, html, Input, Output, dash_table
+import flask
+from dash import dcc, html, Input, Output, State, Patch, dash_table, ctx
+from dash.dash_table.Format import Format, Scheme, Sign, Symbol
+from dash.exceptions import PreventUpdate
 import pandas as pd
 import os
+import re
+import uuid
+
+from tasas_api import register_api
+from tasas_cache import cache_warmer, get_results, result_cache
+from tasas_data import DELTA_COLUMNS, registry
+from tasas_export import parquet_available
+from tasas_http import enable_response_caching
+from tasas_metrics import action_counter, callback_metrics
+from tasas_charts import trend_figure
+from tasas_query import filter_options, filter_spec, min_calif_options, top_entities, top_movers, trend_series
 
 # Initialize the Dash app
 app = dash.Dash(__name__)
 app.title = "Tasas pasivas de todas las entidades financieras"
 
-# Load data - use environment variable for production, fallback to local path
-url_path = "tasas_2024_forward.csv"
+# Per-callback latency and payload histograms, served on /metrics
+callback_metrics.instrument(app)
+callback_metrics.add_source('tasas_result_cache', 'Filter result cache counters.', result_cache.stats)
+callback_metrics.add_source('tasas_cache_warmup', 'Progress of the result cache warm-up.', cache_warmer.stats)
 
-# Load data on app initialization
-def load_initial_data():
-    try:
-        df = pd.read_csv(url_path)
-        if 'mes' in df.columns:
-            df['mes'] = df['mes'].astype(str)
-        return df.to_dict('records')
-    except Exception as e:
-        return None
+# Precompute every rating × plazo result whenever a dataset version loads,
+# and drop the results of versions the registry no longer serves
+result_cache.follow(registry)
+registry.subscribe(cache_warmer.warm)
+
+# Compressed responses; revalidated page, layout and callback graph
+enable_response_caching(app)
+
+# Display names of the "Todas las ofertas" table columns
+TABLE_COLUMN_NAMES = {
+    'razon_social': 'Entidad',
+    'ULTIMA_CALIFICACIÓN': 'Calificación',
+    'plazo': 'Plazo',
+    'tasa_pasiva_efectiva': 'Tasa pasiva',
+    'delta_mes': 'Δ mes anterior',
+    'delta_anual': 'Δ 12 meses'
+}
+
+# Rate changes are in percentage points, always shown with their sign
+DELTA_FORMAT = Format(precision=2, scheme=Scheme.fixed, sign=Sign.positive)
 
-# Initialize data store with loaded data
-initial_data = load_initial_data()
+# Rates are sent as raw numbers and formatted as 'x.xx%' in the browser
+TABLE_COLUMN_SPECS = [
+    {'name': TABLE_COLUMN_NAMES['razon_social'], 'id': 'razon_social'},
+    {'name': TABLE_COLUMN_NAMES['ULTIMA_CALIFICACIÓN'], 'id': 'ULTIMA_CALIFICACIÓN'},
+    {'name': TABLE_COLUMN_NAMES['plazo'], 'id': 'plazo', 'type': 'numeric'},
+    {'name': TABLE_COLUMN_NAMES['tasa_pasiva_efectiva'], 'id': 'tasa_pasiva_efectiva', 'type': 'numeric',
+     'format': Format(precision=2, scheme=Scheme.fixed, symbol=Symbol.yes, symbol_suffix='%')},
+] + [
+    {'name': TABLE_COLUMN_NAMES[col], 'id': col, 'type': 'numeric', 'format': DELTA_FORMAT}
+    for col in DELTA_COLUMNS
+]
+
+# Rises in green, falls in red
+DELTA_STYLES = [
+    style
+    for col in DELTA_COLUMNS
+    for style in (
+        {'if': {'filter_query': f'{{{col}}} > 0', 'column_id': col}, 'color': '#2e7d32'},
+        {'if': {'filter_query': f'{{{col}}} < 0', 'column_id': col}, 'color': '#c62828'},
+    )
+]
 
 # Define the app layout
 app.layout = html.Div([
-    dcc.Store(id='data-store', data=initial_data),
+    # Dataset version key, filled in by refresh_dataset on page load
+    dcc.Store(id='data-store'),
+    # Periodically picks up a newly published dataset version
+    dcc.Interval(id='version-poll', interval=60 * 1000),
     dcc.Location(id='url', refresh=False),
+    # True when the client is at the mobile breakpoint (set in the browser)
+    dcc.Store(id='viewport-store'),
+    # Canonical filter state: the dataset version plus the selected filters,
+    # tagged with the id of the user action that produced it
+    dcc.Store(id='filter-state'),
+    # Number of mobile cards currently rendered
+    dcc.Store(id='mobile-cards-shown', data=0),
+    dcc.Store(id='mobile-cards-rows', data=[]),
     
     # Header
     html.Div([
@@ -40,6 +97,13 @@ app.layout = html.Div([
         html.Div([
             html.H3("🔍 Filtros", style={'marginBottom': '20px'}),
             
+            html.Label("Mes", style={'fontWeight': 'bold', 'marginTop': '10px'}),
+            dcc.Dropdown(
+                id='mes-dropdown',
+                clearable=False,
+                style={'marginBottom': '15px'}
+            ),
+            
             html.Label("Buscar por Razón Social", style={'fontWeight': 'bold', 'marginTop': '10px'}),
             dcc.Input(
                 id='search-input',
@@ -55,6 +119,13 @@ app.layout = html.Div([
                 style={'marginBottom': '15px'}
             ),
             
+            html.Label("Calificación mínima", style={'fontWeight': 'bold', 'marginTop': '10px'}),
+            dcc.Dropdown(
+                id='min-calificacion-dropdown',
+                placeholder='Cualquier calificación',
+                style={'marginBottom': '15px'}
+            ),
+            
             html.Label("Filtrar por Plazo", style={'fontWeight': 'bold', 'marginTop': '10px'}),
             dcc.Dropdown(
                 id='plazo-dropdown',
@@ -78,6 +149,13 @@ app.layout = html.Div([
                                                   'backgroundColor': '#f5f5f5', 'borderRadius': '5px', 
                                                   'cursor': 'pointer', 'marginBottom': '20px'}),
                 html.Div([
+                    html.Label("Mes", style={'fontWeight': 'bold', 'marginTop': '10px'}),
+                    dcc.Dropdown(
+                        id='mes-dropdown-mobile',
+                        clearable=False,
+                        style={'marginBottom': '15px'}
+                    ),
+                    
                     html.Label("Buscar por Razón Social", style={'fontWeight': 'bold', 'marginTop': '10px'}),
                     dcc.Input(
                         id='search-input-mobile',
@@ -93,6 +171,13 @@ app.layout = html.Div([
                         style={'marginBottom': '15px'}
                     ),
                     
+                    html.Label("Calificación mínima", style={'fontWeight': 'bold', 'marginTop': '10px'}),
+                    dcc.Dropdown(
+                        id='min-calificacion-dropdown-mobile',
+                        placeholder='Cualquier calificación',
+                        style={'marginBottom': '15px'}
+                    ),
+                    
                     html.Label("Filtrar por Plazo", style={'fontWeight': 'bold', 'marginTop': '10px'}),
                     dcc.Dropdown(
                         id='plazo-dropdown-mobile',
@@ -108,11 +193,91 @@ app.layout = html.Div([
             # Table/Cards Section
             html.H2("📋 Todas las ofertas", style={'marginBottom': '20px'}),
             
-            # Desktop Table
-            html.Div(id='desktop-table', className='desktop-view'),
+            # Desktop Table (paged, sorted and filtered on the server)
+            html.Div([
+                dash_table.DataTable(
+                    id='ofertas-table',
+                    columns=TABLE_COLUMN_SPECS,
+                    page_action='custom',
+                    page_current=0,
+                    page_size=20,
+                    sort_action='custom',
+                    sort_mode='multi',
+                    sort_by=[],
+                    filter_action='custom',
+                    filter_query='',
+                    filter_options={'case': 'insensitive'},
+                    style_cell={'textAlign': 'left', 'padding': '10px'},
+                    style_header={'backgroundColor': '#667eea', 'color': 'white', 'fontWeight': 'bold'},
+                    style_data={'whiteSpace': 'normal', 'height': 'auto'},
+                    style_data_conditional=DELTA_STYLES,
+                    style_table={'overflowX': 'auto'}
+                ),
+                html.Div(id='table-info', style={'marginTop': '10px', 'color': '#666'})
+            ], id='desktop-table', className='desktop-view'),
+            
+            # Mobile Cards (rendered one page at a time, only on mobile)
+            html.Div([
+                html.Div(id='mobile-cards'),
+                html.Button("Cargar más ofertas", id='mobile-cards-more', n_clicks=0,
+                            className='load-more', style={'display': 'none'})
+            ], className='mobile-view'),
             
-            # Mobile Cards
-            html.Div(id='mobile-cards', className='mobile-view')
+            # Download of the filtered offers, streamed by /api/export
+            html.Div([
+                html.Div([
+                    html.Label("Desde el mes", style={'fontWeight': 'bold'}),
+                    dcc.Dropdown(id='export-desde-dropdown', placeholder='Solo el mes seleccionado')
+                ], style={'flex': '1', 'minWidth': '200px'}),
+                dcc.RadioItems(
+                    id='export-format',
+                    options=[{'label': 'CSV', 'value': 'csv'}] +
+                            ([{'label': 'Parquet', 'value': 'parquet'}] if parquet_available() else []),
+                    value='csv',
+                    inline=True,
+                    inputStyle={'marginRight': '5px', 'marginLeft': '10px'}
+                ),
+                html.A("⬇️ Descargar ofertas", id='export-link', href='', download='',
+                       className='load-more', style={'textDecoration': 'none', 'width': 'auto'})
+            ], style={'display': 'flex', 'flexWrap': 'wrap', 'gap': '10px', 'alignItems': 'flex-end',
+                      'marginTop': '15px'}),
+            
+            # Offers whose rate changed the most, for the current filters
+            html.H2("🔀 Mayores cambios", style={'marginTop': '30px', 'marginBottom': '20px'}),
+            dcc.RadioItems(
+                id='movers-horizon',
+                options=[{'label': 'Frente al mes anterior', 'value': 'delta_mes'},
+                         {'label': 'Frente a 12 meses antes', 'value': 'delta_anual'}],
+                value='delta_mes',
+                inline=True,
+                inputStyle={'marginRight': '5px', 'marginLeft': '10px'},
+                style={'marginBottom': '10px'}
+            ),
+            dash_table.DataTable(
+                id='movers-table',
+                columns=TABLE_COLUMN_SPECS,
+                style_cell={'textAlign': 'left', 'padding': '10px'},
+                style_header={'backgroundColor': '#667eea', 'color': 'white', 'fontWeight': 'bold'},
+                style_data={'whiteSpace': 'normal', 'height': 'auto'},
+                style_data_conditional=DELTA_STYLES,
+                style_table={'overflowX': 'auto'}
+            ),
+            
+            # Rate history per entity and plazo
+            html.H2("📈 Tendencia histórica", style={'marginTop': '30px', 'marginBottom': '20px'}),
+            html.Div([
+                html.Div([
+                    html.Label("Entidades", style={'fontWeight': 'bold'}),
+                    dcc.Dropdown(id='trend-entities-dropdown', multi=True,
+                                 placeholder='Seleccione entidades...')
+                ], style={'flex': '2', 'minWidth': '250px'}),
+                html.Div([
+                    html.Label("Plazos", style={'fontWeight': 'bold'}),
+                    dcc.Dropdown(id='trend-plazos-dropdown', multi=True,
+                                 placeholder='Seleccione plazos...')
+                ], style={'flex': '1', 'minWidth': '150px'})
+            ], style={'display': 'flex', 'flexWrap': 'wrap', 'gap': '10px', 'marginBottom': '10px'}),
+            dcc.Graph(id='trend-graph', config={'displayModeBar': False})
             
         ], className='main-content', style={'width': '70%', 'boxSizing': 'border-box', 'padding': '20px'})
     ], style={'display': 'flex', 'flexWrap': 'wrap', 'width': '100%', 'boxSizing': 'border-box'})
@@ -227,6 +392,18 @@ app.index_string = '''
             .mobile-card-value {
                 color: #333;
             }
+            .load-more {
+                width: 100%;
+                padding: 15px;
+                margin: 10px 0;
+                border: none;
+                border-radius: 10px;
+                background: #667eea;
+                color: white;
+                font-size: 1em;
+                font-weight: bold;
+                cursor: pointer;
+            }
         </style>
     </head>
     <body>
@@ -240,155 +417,283 @@ app.index_string = '''
 </html>
 '''
 
+# Callback to switch clients over to a new dataset version once it is loaded.
+# Its initial call gives each new page the current version; nothing is
+# loaded at import, so workers start serving (and answering /health) at once.
+@app.callback(
+    Output('data-store', 'data'),
+    Input('version-poll', 'n_intervals'),
+    State('data-store', 'data')
+)
+def refresh_dataset(n_intervals, version):
+    try:
+        current_version = registry.refresh().version
+    except Exception:
+        return dash.no_update
+    return current_version if current_version != version else dash.no_update
+
+# Callback to populate the month selector, defaulting to the latest month.
+# A month still in a reloaded dataset stays selected.
+@app.callback(
+    [Output('mes-dropdown', 'options'),
+     Output('mes-dropdown', 'value'),
+     Output('mes-dropdown-mobile', 'options'),
+     Output('mes-dropdown-mobile', 'value'),
+     Output('export-desde-dropdown', 'options')],
+    Input('data-store', 'data'),
+    State('mes-dropdown', 'value'),
+    State('mes-dropdown-mobile', 'value')
+)
+def populate_months(version, selected_mes, selected_mes_mobile):
+    if version is None:
+        return [], None, [], None, []
+    
+    dataset = registry.get(version)
+    mes_options = [{'label': mes, 'value': mes} for mes in reversed(dataset.months)]
+    months = set(dataset.months)
+    mes = selected_mes if selected_mes in months else dataset.latest_month
+    mes_mobile = selected_mes_mobile if selected_mes_mobile in months else dataset.latest_month
+    return mes_options, mes, mes_options, mes_mobile, mes_options
+
 # Callback to populate dropdowns (both desktop and mobile)
 @app.callback(
     [Output('calificacion-dropdown', 'options'),
      Output('plazo-dropdown', 'options'),
      Output('calificacion-dropdown-mobile', 'options'),
-     Output('plazo-dropdown-mobile', 'options')],
-    Input('data-store', 'data')
+     Output('plazo-dropdown-mobile', 'options'),
+     Output('min-calificacion-dropdown', 'options'),
+     Output('min-calificacion-dropdown-mobile', 'options')],
+    [Input('data-store', 'data'),
+     Input('mes-dropdown', 'value')]
 )
-def populate_dropdowns(data):
-    if data is None:
-        return [], [], [], []
+def populate_dropdowns(version, mes):
+    if version is None:
+        return [], [], [], [], [], []
     
-    df = pd.DataFrame(data)
+    dataset = registry.get(version)
+    with callback_metrics.stage('populate_dropdowns', 'options'):
+        calificaciones, plazos = filter_options(dataset.month(mes or dataset.latest_month))
     
-    # Filter for month == '2025-09'
-    if 'mes' in df.columns:
-        df_filtered = df[df['mes'] == '2025-09'].copy()
-    else:
-        df_filtered = df.copy()
-    
-    # Calificaciones with specific order
-    calificaciones_order = [
-        "AAA", "AAA-", "AA+", "AA", "AA-", 
-        "A+", "A", "A-", 
-        "BBB+", "BBB", "BBB-", 
-        "BB+", "BB", "BB-", 
-        "B+", "B", "B-"
-    ]
-    
-    calificaciones_options = []
-    if 'ULTIMA_CALIFICACIÓN' in df_filtered.columns:
-        available_calificaciones = df_filtered['ULTIMA_CALIFICACIÓN'].dropna().unique().tolist()
-        sorted_calificaciones = []
-        for cal in calificaciones_order:
-            if cal in available_calificaciones:
-                sorted_calificaciones.append(cal)
-        for cal in available_calificaciones:
-            if cal not in sorted_calificaciones:
-                sorted_calificaciones.append(cal)
-        calificaciones_options = [{'label': 'Todos', 'value': 'Todos'}] + \
-                                 [{'label': cal, 'value': cal} for cal in sorted_calificaciones]
-    
-    # Plazos
-    plazos_options = []
-    if 'plazo' in df_filtered.columns:
-        available_plazos = sorted(df_filtered['plazo'].dropna().unique().tolist())
-        plazos_options = [{'label': 'Todos', 'value': 'Todos'}] + \
-                        [{'label': str(plazo), 'value': plazo} for plazo in available_plazos]
-    
-    return calificaciones_options, plazos_options, calificaciones_options, plazos_options
-
-# Sync callbacks: Desktop -> Mobile
-@app.callback(
-    [Output('search-input-mobile', 'value'),
+    calificaciones_options = [{'label': 'Todos', 'value': 'Todos'}] + \
+                             [{'label': cal, 'value': cal} for cal in calificaciones]
+    plazos_options = [{'label': 'Todos', 'value': 'Todos'}] + \
+                     [{'label': str(plazo), 'value': plazo} for plazo in plazos]
+    # Only ratings on the scale can be a minimum
+    min_options = [{'label': f"{cal} o mejor", 'value': cal} for cal in min_calif_options(calificaciones)]
+    
+    return calificaciones_options, plazos_options, calificaciones_options, plazos_options, min_options, min_options
+
+# Sync callbacks run in the browser: they only echo values between the
+# desktop and mobile controls, so they never need a server round trip
+SYNC_CONTROLS_JS = """
+function(mes, search, calif, plazo, minCalif) {
+    return [mes, search, calif, plazo, minCalif];
+}
+"""
+
+# Desktop -> Mobile
+app.clientside_callback(
+    SYNC_CONTROLS_JS,
+    [Output('mes-dropdown-mobile', 'value', allow_duplicate=True),
+     Output('search-input-mobile', 'value'),
      Output('calificacion-dropdown-mobile', 'value'),
-     Output('plazo-dropdown-mobile', 'value')],
-    [Input('search-input', 'value'),
+     Output('plazo-dropdown-mobile', 'value'),
+     Output('min-calificacion-dropdown-mobile', 'value')],
+    [Input('mes-dropdown', 'value'),
+     Input('search-input', 'value'),
      Input('calificacion-dropdown', 'value'),
-     Input('plazo-dropdown', 'value')],
+     Input('plazo-dropdown', 'value'),
+     Input('min-calificacion-dropdown', 'value')],
     prevent_initial_call=True
 )
-def sync_desktop_to_mobile(search, calif, plazo):
-    return search, calif, plazo
 
-# Sync callbacks: Mobile -> Desktop
-@app.callback(
-    [Output('search-input', 'value'),
+# Mobile -> Desktop
+app.clientside_callback(
+    SYNC_CONTROLS_JS,
+    [Output('mes-dropdown', 'value', allow_duplicate=True),
+     Output('search-input', 'value'),
      Output('calificacion-dropdown', 'value'),
-     Output('plazo-dropdown', 'value')],
-    [Input('search-input-mobile', 'value'),
+     Output('plazo-dropdown', 'value'),
+     Output('min-calificacion-dropdown', 'value')],
+    [Input('mes-dropdown-mobile', 'value'),
+     Input('search-input-mobile', 'value'),
      Input('calificacion-dropdown-mobile', 'value'),
-     Input('plazo-dropdown-mobile', 'value')],
+     Input('plazo-dropdown-mobile', 'value'),
+     Input('min-calificacion-dropdown-mobile', 'value')],
     prevent_initial_call=True
 )
-def sync_mobile_to_desktop(search, calif, plazo):
-    return search, calif, plazo
 
-# Main callback for filtering and displaying data
+# One clause of a DataTable filter_query, e.g. '{plazo} >= 90' or
+# '{razon_social} icontains "banco"'
+FILTER_CLAUSE_RE = re.compile(
+    r'^\{(?P<column>[^}]+)\}\s*'
+    r'(?P<operator>[is]?(?:contains|datestartswith|eq|ne|lt|le|gt|ge|!=|>=|<=|=|<|>))\s*'
+    r'(?P<value>.*)$'
+)
+
+FILTER_OPERATOR_ALIASES = {'=': 'eq', '!=': 'ne', '<': 'lt', '<=': 'le', '>': 'gt', '>=': 'ge'}
+
+def split_filter_part(filter_part):
+    """Split a filter clause into (column, operator, case_sensitive, value)"""
+    match = FILTER_CLAUSE_RE.match(filter_part.strip())
+    if match is None:
+        return None, None, False, None
+    
+    # 'i'/'s' prefixes select case (in)sensitive matching; default is insensitive
+    operator = match.group('operator')
+    case_sensitive = False
+    if operator[0] in 'is':
+        case_sensitive = operator[0] == 's'
+        operator = operator[1:]
+    operator = FILTER_OPERATOR_ALIASES.get(operator, operator)
+    
+    value_part = match.group('value').strip()
+    if len(value_part) >= 2 and value_part[0] == value_part[-1] and value_part[0] in ('"', "'", '`'):
+        value = value_part[1:-1].replace('\\' + value_part[0], value_part[0])
+    else:
+        try:
+            value = float(value_part)
+        except ValueError:
+            value = value_part
+    
+    return match.group('column'), operator, case_sensitive, value
+
+def apply_filter_query(df, filter_query):
+    """Apply a DataTable filter_query (clauses joined with '&&') to df"""
+    if not filter_query:
+        return df
+    
+    mask = pd.Series(True, index=df.index)
+    for filter_part in filter_query.split(' && '):
+        column, operator, case_sensitive, value = split_filter_part(filter_part)
+        if column not in df.columns:
+            continue
+        series = df[column]
+        
+        if operator == 'contains':
+            mask &= series.astype(str).str.contains(str(value), case=case_sensitive, regex=False, na=False)
+            continue
+        if operator == 'datestartswith':
+            mask &= series.astype(str).str.startswith(str(value), na=False)
+            continue
+        
+        # Compare numerically on numeric columns, as text otherwise
+        if pd.api.types.is_numeric_dtype(series):
+            if isinstance(value, str):
+                continue
+        else:
+            series = series.astype(str)
+            if isinstance(value, float):
+                value = f"{value:g}"
+        
+        if operator == 'eq':
+            mask &= series == value
+        elif operator == 'ne':
+            mask &= series != value
+        elif operator == 'lt':
+            mask &= series < value
+        elif operator == 'le':
+            mask &= series <= value
+        elif operator == 'gt':
+            mask &= series > value
+        elif operator == 'ge':
+            mask &= series >= value
+    
+    return df[mask]
+
+def query_table_page(table_df, sort_by, filter_query, page_current, page_size):
+    """Filter, sort and slice a rate-sorted result table down to one page.
+    
+    Returns the visible page and the total number of matching rows. A page
+    past the end yields the last page.
+    """
+    table_df = apply_filter_query(table_df, filter_query)
+    
+    # Without an explicit sort the table keeps its best-rate-first order
+    if sort_by:
+        table_df = table_df.sort_values(
+            [col['column_id'] for col in sort_by],
+            ascending=[col['direction'] == 'asc' for col in sort_by],
+            kind='mergesort'
+        )
+    
+    start = min(page_current, max(0, (len(table_df) - 1) // page_size)) * page_size
+    return table_df.iloc[start:start + page_size], len(table_df)
+
+FILTER_KEYS = ('version', 'mes', 'search', 'calif', 'plazo', 'min_calif')
+
+# Single place where the desktop and mobile controls are merged. Each real
+# change produces a new state with a new action id; the echo from the
+# mirrored controls yields an identical state and is dropped, so everything
+# downstream runs once per user action.
 @app.callback(
-    [Output('kpi-cards', 'children'),
-     Output('desktop-table', 'children'),
-     Output('mobile-cards', 'children'),
-     Output('filter-info', 'children'),
-     Output('filter-info-mobile', 'children')],
+    Output('filter-state', 'data'),
     [Input('data-store', 'data'),
+     Input('mes-dropdown', 'value'),
      Input('search-input', 'value'),
      Input('calificacion-dropdown', 'value'),
      Input('plazo-dropdown', 'value'),
+     Input('min-calificacion-dropdown', 'value'),
+     Input('mes-dropdown-mobile', 'value'),
      Input('search-input-mobile', 'value'),
      Input('calificacion-dropdown-mobile', 'value'),
-     Input('plazo-dropdown-mobile', 'value')]
+     Input('plazo-dropdown-mobile', 'value'),
+     Input('min-calificacion-dropdown-mobile', 'value')],
+    State('filter-state', 'data')
 )
-def update_dashboard(data, search_text, selected_calificacion, selected_plazo, 
-                     search_text_mobile, selected_calificacion_mobile, selected_plazo_mobile):
-    # Use desktop values if available, otherwise use mobile (they should be synced anyway)
-    search = search_text if search_text else search_text_mobile
-    calif = selected_calificacion if selected_calificacion else selected_calificacion_mobile
-    plazo = selected_plazo if selected_plazo else selected_plazo_mobile
-    
-    if data is None:
-        return html.Div("Error loading data"), html.Div(), html.Div(), html.Div(), html.Div()
-    
-    df = pd.DataFrame(data)
-    
-    # Filter for month == '2025-09'
-    if 'mes' in df.columns:
-        df['mes'] = df['mes'].astype(str)
-        df_filtered = df[df['mes'] == '2025-09'].copy()
-    else:
-        df_filtered = df.copy()
-    
-    if len(df_filtered) == 0:
-        return html.Div("No data found for month '2025-09'"), html.Div(), html.Div(), html.Div(), html.Div()
-    
-    # Apply filters
-    df_filtered_search = df_filtered.copy()
-    
-    # Filter by search text
-    if search:
-        df_filtered_search = df_filtered_search[
-            df_filtered_search['razon_social'].str.contains(
-                search, case=False, na=False
-            )
-        ]
-    
-    # Filter by calificación
-    if calif and calif != 'Todos':
-        df_filtered_search = df_filtered_search[
-            df_filtered_search['ULTIMA_CALIFICACIÓN'] == calif
-        ]
-    
-    # Filter by plazo
-    if plazo and plazo != 'Todos':
-        df_filtered_search = df_filtered_search[
-            df_filtered_search['plazo'] == plazo
-        ]
-    
-    # Calculate KPIs
-    if 'tasa_pasiva_efectiva' in df_filtered_search.columns:
-        mean_tasa = df_filtered_search['tasa_pasiva_efectiva'].mean()
-        max_tasa = df_filtered_search['tasa_pasiva_efectiva'].max()
-        min_tasa = df_filtered_search['tasa_pasiva_efectiva'].min()
+def update_filter_state(version, selected_mes, search_text, selected_calificacion, selected_plazo, selected_min,
+                        selected_mes_mobile, search_text_mobile, selected_calificacion_mobile, selected_plazo_mobile,
+                        selected_min_mobile, state):
+    # Nothing to filter until the dataset version arrives
+    if version is None:
+        raise PreventUpdate
+    action_counter.record('update_filter_state', None)
+    if isinstance(ctx.triggered_id, str) and ctx.triggered_id.endswith('-mobile'):
+        filters = (selected_mes_mobile, search_text_mobile, selected_calificacion_mobile, selected_plazo_mobile,
+                   selected_min_mobile)
     else:
-        mean_tasa = max_tasa = min_tasa = 0
+        filters = (selected_mes, search_text, selected_calificacion, selected_plazo, selected_min)
     
-    if 'razon_social' in df_filtered_search.columns:
-        nunique_razon = df_filtered_search['razon_social'].nunique()
-    else:
-        nunique_razon = 0
+    new_state = dict(zip(FILTER_KEYS, (version,) + filters))
+    if state and all(state.get(key) == value for key, value in new_state.items()):
+        return dash.no_update
+    new_state['action'] = uuid.uuid4().hex[:12]
+    return new_state
+
+def read_filter_state(state):
+    """Return (version, mes, search, calif, plazo, min_calif) from the filter-state store"""
+    return tuple(state.get(key) for key in FILTER_KEYS)
+
+# Main callback for filtering and displaying data
+@app.callback(
+    [Output('kpi-cards', 'children'),
+     Output('filter-info', 'children'),
+     Output('filter-info-mobile', 'children')],
+    Input('filter-state', 'data')
+)
+def update_dashboard(state):
+    # Wait for the first canonical filter state
+    if not state:
+        raise PreventUpdate
+    action_counter.record('update_dashboard', state['action'])
+    version, mes, search, calif, plazo, min_calif = read_filter_state(state)
+    
+    if version is None:
+        return html.Div("Error loading data"), html.Div(), html.Div()
+    
+    dataset = registry.get(version)
+    mes = mes or dataset.latest_month
+    with callback_metrics.stage('update_dashboard', 'results'):
+        result = get_results(dataset, mes, search, calif, plazo, min_calif)
+    
+    if result.month_rows == 0:
+        return html.Div(f"No data found for month '{mes}'"), html.Div(), html.Div()
+    
+    # KPIs come precomputed with the (cached) result
+    mean_tasa = result.mean
+    max_tasa = result.max
+    min_tasa = result.min
+    nunique_razon = result.nunique
     
     # Create KPI cards
     kpi_cards = html.Div([
@@ -413,76 +718,273 @@ def update_dashboard(data, search_text, selected_calificacion, selected_plazo,
         ], className='kpi-card', style={'flex': '1', 'minWidth': '200px'})
     ], style={'display': 'flex', 'flexWrap': 'wrap', 'gap': '10px'})
     
-    # Prepare table data
-    table_columns = ['razon_social', 'ULTIMA_CALIFICACIÓN', 'plazo', 'tasa_pasiva_efectiva']
-    missing_cols = [col for col in table_columns if col not in df_filtered_search.columns]
+    # Filter info (same for both desktop and mobile)
+    filter_info = html.Div([
+        html.P(f"📊 Mostrando {len(result)} de {result.month_rows} registros")
+    ])
     
-    if missing_cols:
-        table_df = df_filtered_search[[col for col in table_columns if col in df_filtered_search.columns]].copy()
+    return kpi_cards, filter_info, filter_info
+
+# Detect the mobile breakpoint in the browser with the CSS media query, and
+# follow it across resizes and rotation so the cards load when it is crossed
+app.clientside_callback(
+    """
+    function(pathname) {
+        var query = window.matchMedia('(max-width: 768px)');
+        if (!window.tasasViewportListener) {
+            window.tasasViewportListener = function(event) {
+                dash_clientside.set_props('viewport-store', {data: event.matches});
+            };
+            query.addEventListener('change', window.tasasViewportListener);
+        }
+        return query.matches;
+    }
+    """,
+    Output('viewport-store', 'data'),
+    Input('url', 'pathname')
+)
+
+# The export link is built in the browser from the canonical filter state
+app.clientside_callback(
+    """
+    function(state, desde, formato) {
+        if (!state || !state.mes) { return ''; }
+        const params = new URLSearchParams({mes: state.mes, formato: formato || 'csv'});
+        if (desde) { params.set('desde', desde); }
+        if (state.search) { params.set('q', state.search); }
+        if (state.calif && state.calif !== 'Todos') { params.set('calificacion', state.calif); }
+        if (state.min_calif) { params.set('calificacion_minima', state.min_calif); }
+        if (state.plazo !== null && state.plazo !== undefined && state.plazo !== 'Todos') {
+            params.set('plazo', state.plazo);
+        }
+        return '""" + app.config.requests_pathname_prefix + """api/export?' + params.toString();
+    }
+    """,
+    Output('export-link', 'href'),
+    [Input('filter-state', 'data'),
+     Input('export-desde-dropdown', 'value'),
+     Input('export-format', 'value')]
+)
+
+# Number of mobile cards rendered per page
+MOBILE_PAGE_SIZE = 20
+
+def table_records(rows):
+    """Return result rows as raw records, with rates and their changes rounded to 2 decimals"""
+    return rows.assign(**{
+        col: rows[col].astype('float64').round(2)
+        for col in ['tasa_pasiva_efectiva'] + DELTA_COLUMNS
+    }).to_dict('records')
+
+# Mobile cards callback: sends the raw rows of the first page, then appends
+# one page per "Cargar más" click. Nothing is computed for desktop clients.
+@app.callback(
+    [Output('mobile-cards-rows', 'data'),
+     Output('mobile-cards-shown', 'data'),
+     Output('mobile-cards-more', 'style')],
+    [Input('filter-state', 'data'),
+     Input('viewport-store', 'data'),
+     Input('mobile-cards-more', 'n_clicks')],
+    State('mobile-cards-shown', 'data')
+)
+def update_mobile_cards(state, is_mobile, n_clicks, shown):
+    # Wait for the first canonical filter state
+    if not state:
+        raise PreventUpdate
+    if ctx.triggered_id == 'filter-state':
+        action_counter.record('update_mobile_cards', state['action'])
+    version, mes, search, calif, plazo, min_calif = read_filter_state(state)
+    if not is_mobile or version is None:
+        return [], 0, {'display': 'none'}
+    
+    dataset = registry.get(version)
+    with callback_metrics.stage('update_mobile_cards', 'results'):
+        table = get_results(dataset, mes or dataset.latest_month, search, calif, plazo, min_calif).table
+    
+    if ctx.triggered_id == 'mobile-cards-more':
+        # Only send the next page, appended to the rows already rendered
+        start = shown or 0
+        rows = Patch()
+        rows.extend(table_records(table.iloc[start:start + MOBILE_PAGE_SIZE]))
     else:
-        table_df = df_filtered_search[table_columns].copy()
-    
-    # Round and format
-    if 'tasa_pasiva_efectiva' in table_df.columns:
-        table_df['tasa_pasiva_efectiva'] = table_df['tasa_pasiva_efectiva'].round(2)
-        table_df = table_df.sort_values('tasa_pasiva_efectiva', ascending=False)
-        table_df['tasa_pasiva_efectiva'] = table_df['tasa_pasiva_efectiva'].apply(lambda x: f"{x:.2f}%")
-    
-    # Rename columns
-    column_rename_map = {
-        'razon_social': 'Entidad',
-        'ULTIMA_CALIFICACIÓN': 'Calificación',
-        'plazo': 'Plazo',
-        'tasa_pasiva_efectiva': 'Tasa pasiva'
+        start = 0
+        rows = table_records(table.iloc[:MOBILE_PAGE_SIZE])
+    
+    shown = min(start + MOBILE_PAGE_SIZE, len(table))
+    more_style = {'display': 'block'} if shown < len(table) else {'display': 'none'}
+    return rows, shown, more_style
+
+# The cards themselves are built in the browser from the raw rows
+app.clientside_callback(
+    """
+    function(rows) {
+        function el(type, className, children, style) {
+            var props = {className: className, children: children};
+            if (style) {
+                props.style = style;
+            }
+            return {type: type, namespace: 'dash_html_components', props: props};
+        }
+        function rate(value) {
+            return value == null ? 'N/A' : value.toFixed(2) + '%';
+        }
+        function delta(value) {
+            return value == null ? 'N/A' : (value > 0 ? '+' : '') + value.toFixed(2);
+        }
+        function row(label, value, style) {
+            return el('Div', 'mobile-card-row', [
+                el('Span', 'mobile-card-label', label + ': '),
+                el('Span', 'mobile-card-value', value, style)
+            ]);
+        }
+        return (rows || []).map(function(r) {
+            var calificacion = r['ULTIMA_CALIFICACIÓN'];
+            return el('Div', 'mobile-card', [
+                el('Div', 'mobile-card-header', r.razon_social),
+                el('Div', undefined, [
+                    row('Calificación', calificacion == null ? 'N/A' : String(calificacion)),
+                    row('Plazo', String(r.plazo)),
+                    row('Tasa pasiva', rate(r.tasa_pasiva_efectiva),
+                        {fontSize: '1.2em', fontWeight: 'bold', color: '#667eea'}),
+                    row('Δ mes anterior', delta(r.delta_mes)),
+                    row('Δ 12 meses', delta(r.delta_anual))
+                ])
+            ]);
+        });
     }
-    table_df = table_df.rename(columns=column_rename_map)
-        
-    # Desktop table
-    desktop_table = dash_table.DataTable(
-        data=table_df.to_dict('records'),
-        columns=[{'name': col, 'id': col} for col in table_df.columns],
-        sort_action='native',
-        style_cell={'textAlign': 'left', 'padding': '10px'},
-        style_header={'backgroundColor': '#667eea', 'color': 'white', 'fontWeight': 'bold'},
-        style_data={'whiteSpace': 'normal', 'height': 'auto'},
-        page_size=20,
-        style_table={'overflowX': 'auto'}
-    )
+    """,
+    Output('mobile-cards', 'children'),
+    Input('mobile-cards-rows', 'data')
+)
+
+# Table callback: only the visible page is sent to the browser
+@app.callback(
+    [Output('ofertas-table', 'data'),
+     Output('ofertas-table', 'page_count'),
+     Output('ofertas-table', 'page_current'),
+     Output('table-info', 'children')],
+    [Input('filter-state', 'data'),
+     Input('ofertas-table', 'page_current'),
+     Input('ofertas-table', 'page_size'),
+     Input('ofertas-table', 'sort_by'),
+     Input('ofertas-table', 'filter_query')]
+)
+def update_table(state, page_current, page_size, sort_by, filter_query):
+    # Wait for the first canonical filter state
+    if not state:
+        raise PreventUpdate
+    if ctx.triggered_id == 'filter-state':
+        action_counter.record('update_table', state['action'])
+    version, mes, search, calif, plazo, min_calif = read_filter_state(state)
     
-    # Mobile cards
-    mobile_cards = html.Div([
-        html.Div([
-            html.Div(row['Entidad'], className='mobile-card-header'),
-            html.Div([
-                html.Div([
-                    html.Span('Calificación: ', className='mobile-card-label'),
-                    html.Span(str(row.get('Calificación', 'N/A')), className='mobile-card-value')
-                ], className='mobile-card-row'),
-                html.Div([
-                    html.Span('Plazo: ', className='mobile-card-label'),
-                    html.Span(str(row.get('Plazo', 'N/A')), className='mobile-card-value')
-                ], className='mobile-card-row'),
-                html.Div([
-                    html.Span('Tasa pasiva: ', className='mobile-card-label'),
-                    html.Span(str(row.get('Tasa pasiva', 'N/A')), className='mobile-card-value',
-                             style={'fontSize': '1.2em', 'fontWeight': 'bold', 'color': '#667eea'})
-                ], className='mobile-card-row')
-            ])
-        ], className='mobile-card')
-        for _, row in table_df.iterrows()
-    ])
+    if version is None:
+        return [], 0, 0, ""
     
-    # Filter info (same for both desktop and mobile)
-    filter_info = html.Div([
-        html.P(f"📊 Mostrando {len(df_filtered_search)} de {len(df_filtered)} registros")
-    ])
+    # Go back to the first page whenever the result set or its order changes
+    triggered = ctx.triggered_prop_ids
+    if ('filter-state.data' in triggered or 'ofertas-table.filter_query' in triggered
+            or 'ofertas-table.sort_by' in triggered):
+        page_current = 0
+    page_current = page_current or 0
+    
+    dataset = registry.get(version)
+    with callback_metrics.stage('update_table', 'results'):
+        result = get_results(dataset, mes or dataset.latest_month, search, calif, plazo, min_calif)
+    with callback_metrics.stage('update_table', 'page'):
+        page_df, total = query_table_page(result.table, sort_by, filter_query, page_current, page_size)
+    with callback_metrics.stage('update_table', 'records'):
+        records = table_records(page_df)
+    
+    page_count = max(1, -(-total // page_size))
+    # Same page query_table_page fell back to
+    page_current = min(page_current, page_count - 1)
     
-    return kpi_cards, desktop_table, mobile_cards, filter_info, filter_info
+    return records, page_count, page_current, f"{total:,} ofertas"
+
+# Trend controls: every entity and plazo in the history; starts with the
+# best three entities of the latest month at 360 days (or the first plazo)
+@app.callback(
+    [Output('trend-entities-dropdown', 'options'),
+     Output('trend-entities-dropdown', 'value'),
+     Output('trend-plazos-dropdown', 'options'),
+     Output('trend-plazos-dropdown', 'value')],
+    Input('data-store', 'data'),
+    State('trend-entities-dropdown', 'value'),
+    State('trend-plazos-dropdown', 'value')
+)
+def populate_trend_controls(version, entities, plazos):
+    if version is None:
+        return [], [], [], []
+    
+    trends = registry.get(version).trends
+    entity_options = [{'label': entity, 'value': entity} for entity in sorted(trends.entities)]
+    plazo_options = [{'label': f"{plazo} días", 'value': plazo} for plazo in trends.plazos]
+    
+    # Keep the user's selection across dataset reloads
+    if not plazos:
+        plazos = [360] if 360 in trends.plazos else list(trends.plazos)[:1]
+    if not entities:
+        entities = top_entities(registry.get(version), plazos[0]) if plazos else []
+    
+    return entity_options, entities, plazo_options, plazos
+
+# Trend chart: each line is a slice of the dataset's dense trend array
+@app.callback(
+    Output('trend-graph', 'figure'),
+    [Input('data-store', 'data'),
+     Input('trend-entities-dropdown', 'value'),
+     Input('trend-plazos-dropdown', 'value')]
+)
+def update_trend(version, entities, plazos):
+    if version is None:
+        return trend_figure([], [])
+    
+    dataset = registry.get(version)
+    with callback_metrics.stage('update_trend', 'series'):
+        series = trend_series(dataset, entities or [], plazos or [])
+    return trend_figure(dataset.months, series)
+
+# Biggest movers: a partial selection over the deltas aligned at load
+@app.callback(
+    Output('movers-table', 'data'),
+    [Input('filter-state', 'data'),
+     Input('movers-horizon', 'value')]
+)
+def update_movers(state, horizon):
+    # Wait for the first canonical filter state
+    if not state:
+        raise PreventUpdate
+    if ctx.triggered_id == 'filter-state':
+        action_counter.record('update_movers', state['action'])
+    version, mes, search, calif, plazo, min_calif = read_filter_state(state)
+    if version is None:
+        return []
+    
+    dataset = registry.get(version)
+    spec = filter_spec(mes or dataset.latest_month, search, calif, plazo, min_calif)
+    with callback_metrics.stage('update_movers', 'movers'):
+        movers = top_movers(dataset, spec, horizon or 'delta_mes')
+    return table_records(movers)
 
 # Expose server for gunicorn
 server = app.server
 
+# JSON API for machine clients, sharing the dataset and the result cache
+register_api(app, registry)
+
+# Health check: answers immediately, also while the dataset is still loading
+@server.route('/health')
+def health():
+    dataset = registry.loaded()
+    return flask.jsonify(
+        status='ok',
+        dataset=dataset.version if dataset is not None else None,
+        rows=len(dataset) if dataset is not None else 0,
+        warmup=cache_warmer.stats()
+    )
+
 if __name__ == '__main__':
+    registry.load_in_background()
     app.run(debug=True)
 
 
@@ -0,0 +1,107 @@
+import numpy as np
+
+from tasas_data import TABLE_COLUMNS
+from tasas_query import filter_spec, matching_rows
+
+# Rows per batch; bounds the memory of an export whatever its size
+EXPORT_BATCH_ROWS = 50_000
+EXPORT_COLUMNS = ['mes'] + TABLE_COLUMNS
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def export_months(dataset, mes, desde=None):
+    """Return the months from ``desde`` up to ``mes`` (just ``mes`` without ``desde``)"""
+    if not desde:
+        return [mes] if mes in dataset.month_ranges else []
+    start, end = sorted([desde, mes])
+    return [m for m in dataset.months if start <= m <= end]
+
+
+def export_batches(dataset, months, search=None, calif=None, plazo=None, min_calif=None,
+                   batch_rows=EXPORT_BATCH_ROWS):
+    """Yield the filtered offers of ``months`` as DataFrames of at most ``batch_rows`` rows.
+
+    Each month is ordered like the dashboard table, best rate first. Only
+    the row positions of one month are held at a time, never the output.
+    """
+    df = dataset.df[EXPORT_COLUMNS]
+    rates = dataset.df['tasa_pasiva_efectiva'].to_numpy()
+    for mes in months:
+        rows = matching_rows(dataset, filter_spec(mes, search, calif, plazo, min_calif))
+        rows = rows[np.argsort(-rates[rows], kind='stable')]
+        for start in range(0, len(rows), batch_rows):
+            yield df.take(rows[start:start + batch_rows])
+
+
+def iter_csv(dataset, batches):
+    """Yield a CSV file as encoded chunks, one per batch"""
+    yield (','.join(EXPORT_COLUMNS) + '\n').encode('utf-8')
+    for batch in batches:
+        yield batch.to_csv(index=False, header=False, float_format='%.4f').encode('utf-8')
+
+
+class ChunkSink:
+    """Write-only file object that hands out what was written since the last drain"""
+
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_parquet(dataset, batches):
+    """Yield a Parquet file as chunks, one row group per batch"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Fixed schema from the full columns, so every row group (and an empty
+    # export) has the same dictionary types
+    schema = pa.Schema.from_pandas(dataset.df[EXPORT_COLUMNS].iloc[:0], preserve_index=False)
+    sink = ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    try:
+        for batch in batches:
+            writer.write_table(pa.Table.from_pandas(batch, schema=schema, preserve_index=False))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def iter_export(dataset, fmt, months, search=None, calif=None, plazo=None, min_calif=None):
+    """Yield the bytes of the ``fmt`` ('csv' or 'parquet') export of the filtered offers"""
+    batches = export_batches(dataset, months, search, calif, plazo, min_calif)
+    if fmt == 'parquet':
+        return iter_parquet(dataset, batches)
+    return iter_csv(dataset, batches)
+
+
+def export_filename(fmt, months):
+    """Return the download name of an export of ``months``"""
+    span = months[0] if len(months) == 1 else f"{months[0]}_{months[-1]}"
+    return f"tasas_{span}.{EXPORT_FORMATS[fmt][1]}"
+
+
+def parquet_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
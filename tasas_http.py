@@ -0,0 +1,140 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # optional; responses fall back to gzip
+    brotli = None
+
+# Only text payloads are worth compressing
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/javascript', 'text/javascript',
+    'text/html', 'text/css', 'text/plain', 'image/svg+xml',
+}
+MIN_COMPRESS_SIZE = 500
+
+
+class CompressedBodies:
+    """Small LRU of compressed response bodies keyed by content hash and encoding.
+
+    The layout and the callback graph are identical on every request, so
+    each is compressed once per process.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, digest, encoding, data):
+        key = (digest, encoding)
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                return body
+        body = compress(data, encoding)
+        with self._lock:
+            self._entries[key] = body
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return body
+
+
+def compress(data, encoding):
+    """Return ``data`` compressed with ``encoding`` ('br' or 'gzip')"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6)
+
+
+def choose_encoding(request):
+    """Return the best content encoding the client accepts, or None"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def dataset_etag(version, request):
+    """Return the ETag of a GET whose body only depends on the dataset ``version`` and its URL"""
+    return hashlib.sha1(f"{version} {request.full_path}".encode('utf-8')).hexdigest()[:20]
+
+
+def versioned_response(version, build):
+    """Return ``build()`` tagged with the dataset ``version``, or a 304 if the client has it.
+
+    The tag is weak because the body may be sent compressed; ``build`` is
+    only called when the client's copy is stale.
+    """
+    import flask
+
+    etag = dataset_etag(version, flask.request)
+    if flask.request.if_none_match.contains_weak(etag):
+        response = flask.Response(status=304)
+    else:
+        response = build()
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def enable_response_caching(app):
+    """Compress Dash responses and serve its static GETs with validators.
+
+    Every compressible response is sent gzip (or brotli, when installed)
+    encoded. The layout and the callback graph only change when the app
+    restarts. They get a content-derived ETag and ``Cache-Control:
+    no-cache``, so browsers and proxies revalidate them with a cheap 304
+    instead of downloading them again. The page itself is left out: Dash
+    signs a fresh id into its config on every render.
+    """
+    import flask
+
+    server = app.server
+    prefix = app.config.requests_pathname_prefix
+    revalidated_paths = {prefix + '_dash-layout', prefix + '_dash-dependencies'}
+    bodies = CompressedBodies()
+
+    @server.after_request
+    def cache_and_compress(response):
+        request = flask.request
+        if (response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers):
+            return response
+
+        static = request.method == 'GET' and response.status_code == 200
+        revalidate = static and request.path in revalidated_paths
+        compressible = (response.mimetype in COMPRESSIBLE_MIMETYPES
+                        and (response.content_length or 0) >= MIN_COMPRESS_SIZE)
+        if not (revalidate or compressible):
+            return response
+
+        data = response.get_data()
+        encoding = choose_encoding(request) if compressible else None
+        if compressible:
+            response.vary.add('Accept-Encoding')
+
+        digest = hashlib.sha1(data).hexdigest()[:20] if revalidate else None
+        if revalidate:
+            # Each encoding is a different representation with its own tag
+            etag = f"{digest}-{encoding}" if encoding else digest
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            if request.if_none_match.contains(etag):
+                response.status_code = 304
+                response.set_data(b'')
+                return response
+
+        if encoding:
+            # Revalidated bodies are compressed once; everything else every time
+            body = bodies.get(digest, encoding, data) if revalidate else compress(data, encoding)
+            response.set_data(body)
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+    return server
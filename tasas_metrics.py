@@ -0,0 +1,230 @@
+import bisect
+import contextlib
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class ActionCounter:
+    """Counts server-side callback executions per user action.
+
+    A user action is one change of the dashboard's canonical filter state,
+    identified by the action id stored with it. Every dependent callback
+    should run exactly once per action; repeated executions are counted as
+    duplicates and logged.
+    """
+
+    def __init__(self, max_actions=1000):
+        self.max_actions = max_actions
+        self._lock = threading.Lock()
+        self._actions = OrderedDict()
+        self.actions = 0
+        self.executions = Counter()
+        self.duplicates = Counter()
+
+    def record(self, callback, action):
+        """Record one execution of ``callback`` for ``action``; returns its count for that action"""
+        with self._lock:
+            self.executions[callback] += 1
+            if action is None:
+                return 1
+            counts = self._actions.get(action)
+            if counts is None:
+                counts = self._actions[action] = Counter()
+                self.actions += 1
+                while len(self._actions) > self.max_actions:
+                    self._actions.popitem(last=False)
+            counts[callback] += 1
+            count = counts[callback]
+            if count > 1:
+                self.duplicates[callback] += 1
+        if count > 1:
+            logger.warning("%s ran %d times for action %s", callback, count, action)
+        return count
+
+    def stats(self):
+        """Return the counters as a dict"""
+        with self._lock:
+            return {
+                'actions': self.actions,
+                'executions': dict(self.executions),
+                'duplicates': dict(self.duplicates),
+            }
+
+
+# Process-wide counter for the Dash callbacks
+action_counter = ActionCounter()
+
+
+# Bucket upper bounds, in seconds and bytes
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def format_labels(names, values, extra=''):
+    labels = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative histogram with labels, rendered in the Prometheus text format.
+
+    Observing a value is a bisect and three increments under a lock, so it is
+    cheap enough to leave on in production.
+    """
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, *labels):
+        """Add one observation for the series identified by ``labels``"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        """Return this histogram's lines in the Prometheus text format"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = [(labels, list(counts), total, count)
+                      for labels, (counts, total, count) in sorted(self._series.items())]
+        for labels, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = format_labels(self.labelnames, labels, f'le="{format_value(bound)}"')
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            label_text = format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_text} {format_value(float(total))}')
+            lines.append(f'{self.name}_count{label_text} {count}')
+        return lines
+
+
+class CallbackMetrics:
+    """Latency and payload-size histograms for the Dash callbacks.
+
+    Whole requests to ``/_dash-update-component`` are measured by the Flask
+    hooks installed with ``instrument``. Callbacks can time their own stages
+    with ``stage``. Each gunicorn worker keeps its own counts; Prometheus
+    should scrape every worker, or sum them on its side.
+    """
+
+    def __init__(self):
+        self.latency = Histogram(
+            'tasas_callback_duration_seconds', 'Wall time of Dash callback requests.',
+            ['callback'], LATENCY_BUCKETS)
+        self.request_size = Histogram(
+            'tasas_callback_request_bytes', 'Serialized size of Dash callback requests.',
+            ['callback'], SIZE_BUCKETS)
+        self.response_size = Histogram(
+            'tasas_callback_response_bytes', 'Serialized size of Dash callback responses.',
+            ['callback', 'status'], SIZE_BUCKETS)
+        self.stage_latency = Histogram(
+            'tasas_callback_stage_duration_seconds', 'Wall time of the stages inside a Dash callback.',
+            ['callback', 'stage'], LATENCY_BUCKETS)
+        self.histograms = [self.latency, self.request_size, self.response_size, self.stage_latency]
+        # Extra sources of counters for /metrics: name -> (help, function returning a dict)
+        self.sources = {}
+
+    @contextlib.contextmanager
+    def stage(self, callback, stage):
+        """Time the enclosed block as one stage of ``callback``"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_latency.observe(time.perf_counter() - start, callback, stage)
+
+    def add_source(self, name, documentation, stats):
+        """Expose the numeric values of ``stats()`` under ``name`` on /metrics"""
+        self.sources[name] = (documentation, stats)
+
+    def render(self):
+        """Return every metric in the Prometheus text format"""
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.render())
+        for name, (documentation, stats) in self.sources.items():
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} gauge')
+            for key, value in stats().items():
+                if isinstance(value, dict):
+                    for sub_key, sub_value in value.items():
+                        lines.append(f'{name}{{key="{escape_label(key)}",callback="{escape_label(sub_key)}"}} {sub_value}')
+                else:
+                    lines.append(f'{name}{{key="{escape_label(key)}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def instrument(self, app, route='/metrics'):
+        """Measure the callback requests of Dash ``app`` and serve /metrics on its server"""
+        import flask
+
+        server = app.server
+        callback_path = app.config.requests_pathname_prefix + '_dash-update-component'
+        names = {}
+
+        def callback_name(output):
+            # Outputs come from the client; anything the app did not register
+            # shares one label so the series stay bounded
+            if not isinstance(output, str) or output not in app.callback_map:
+                return 'unknown'
+            name = names.get(output)
+            if name is None:
+                function = app.callback_map[output].get('callback')
+                name = names[output] = getattr(function, '__name__', None) or output
+            return name
+
+        @server.before_request
+        def start_timer():
+            if flask.request.path == callback_path:
+                flask.g.tasas_callback_start = time.perf_counter()
+
+        @server.after_request
+        def record_callback(response):
+            start = flask.g.pop('tasas_callback_start', None)
+            if start is None:
+                return response
+            body = flask.request.get_json(silent=True) or {}
+            name = callback_name(body.get('output'))
+            self.latency.observe(time.perf_counter() - start, name)
+            self.request_size.observe(flask.request.content_length or 0, name)
+            if not response.is_streamed:
+                self.response_size.observe(response.calculate_content_length() or 0, name, response.status_code)
+            return response
+
+        @server.route(route)
+        def metrics():
+            return flask.Response(self.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+        return server
+
+
+# Process-wide callback metrics for the Dash server
+callback_metrics = CallbackMetrics()
+callback_metrics.add_source(
+    'tasas_callback_actions', 'Dash callback executions and duplicates per user action.', action_counter.stats)
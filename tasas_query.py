@@ -0,0 +1,196 @@
+import collections
+
+import numpy as np
+import pandas as pd
+
+from tasas_data import CALIFICACIONES_ORDER, TABLE_COLUMNS, normalize_text, rating_limit
+
+
+def filter_options(df):
+    """Return the ratings (in scale order) and the sorted plazos present in ``df``"""
+    # Rating categories already follow the scale; keep the ones in use
+    ratings = df['ULTIMA_CALIFICACIÓN'].cat
+    codes = ratings.codes.to_numpy()
+    calificaciones = ratings.categories[np.unique(codes[codes >= 0])].tolist()
+    plazos = sorted(df['plazo'].dropna().unique().tolist())
+    return calificaciones, plazos
+
+
+def min_calif_options(calificaciones):
+    """Return the ratings of ``calificaciones`` that can be used as a minimum"""
+    return [cal for cal in calificaciones if cal in CALIFICACIONES_ORDER]
+
+
+# One filter selection; hashable, so it doubles as the result cache key
+FilterSpec = collections.namedtuple('FilterSpec', ['mes', 'search', 'calif', 'plazo', 'min_calif'])
+
+
+def filter_spec(mes, search=None, calif=None, plazo=None, min_calif=None):
+    """Return the canonical FilterSpec for a filter selection.
+
+    Search matching ignores case and accents, so the text is normalized the
+    same way as the search index; empty selections collapse to 'Todos'.
+    """
+    search = normalize_text(search or '').strip()
+    calif = calif if calif else 'Todos'
+    plazo = plazo if plazo not in (None, '') else 'Todos'
+    if plazo != 'Todos':
+        plazo = int(plazo)
+    min_calif = min_calif if min_calif else 'Todos'
+    return FilterSpec(mes, search, calif, plazo, min_calif)
+
+
+class FilterResult:
+    """KPIs and the rate-sorted offers table for one filter combination.
+
+    ``kpis`` comes from the dataset's aggregate cube when available;
+    otherwise the KPIs are computed from the table itself.
+    """
+
+    def __init__(self, table, month_rows, kpis=None):
+        self.table = table
+        self.month_rows = month_rows
+        if kpis is None:
+            rates = table['tasa_pasiva_efectiva']
+            kpis = {
+                'mean': rates.mean(),
+                'max': rates.max(),
+                'min': rates.min(),
+                'nunique': table['razon_social'].nunique(),
+            }
+        self.mean = kpis['mean']
+        self.max = kpis['max']
+        self.min = kpis['min']
+        self.nunique = kpis['nunique']
+
+    def __len__(self):
+        return len(self.table)
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by this result"""
+        return int(self.table.memory_usage(index=True, deep=False).sum()) + 256
+
+
+def matching_rows(dataset, spec):
+    """Return the sorted row positions of ``dataset`` selected by ``spec``.
+
+    The month is a row range and the search text a list of positions from
+    the name index; the rating and plazo filters are then combined into a
+    single mask over the raw column arrays of those rows only.
+    """
+    start, stop = dataset.month_ranges.get(spec.mes, (0, 0))
+    if spec.search:
+        rows = dataset.search(spec.mes, spec.search)
+        select = rows
+    else:
+        rows = None
+        select = slice(start, stop)
+
+    df = dataset.df
+    mask = None
+    if spec.calif != 'Todos':
+        ratings = df['ULTIMA_CALIFICACIÓN'].cat
+        code = ratings.categories.get_indexer([spec.calif])[0]
+        # -1 would match missing ratings; an unknown rating matches nothing
+        mask = ratings.codes.to_numpy()[select] == (code if code >= 0 else -2)
+    if spec.min_calif != 'Todos':
+        ratings = df['ULTIMA_CALIFICACIÓN'].cat
+        limit = rating_limit(ratings.categories, spec.min_calif)
+        codes = ratings.codes.to_numpy()
+        # Codes follow the rating scale, best first. Read as unsigned, a
+        # missing rating (-1) is the largest code, so a single comparison
+        # keeps the ratings at least as good as the minimum
+        codes = codes.view(np.dtype(f'u{codes.dtype.itemsize}'))
+        min_mask = codes[select] < limit
+        mask = min_mask if mask is None else mask & min_mask
+    if spec.plazo != 'Todos':
+        plazo_mask = df['plazo'].to_numpy()[select] == spec.plazo
+        mask = plazo_mask if mask is None else mask & plazo_mask
+
+    if rows is None:
+        rows = np.arange(start, stop)
+    return rows if mask is None else rows[mask]
+
+
+def query(dataset, spec):
+    """Run ``spec`` against ``dataset`` and return its FilterResult"""
+    rows = matching_rows(dataset, spec)
+
+    # Best rate first; a stable sort keeps ties in file order
+    rates = dataset.df['tasa_pasiva_efectiva'].to_numpy()[rows]
+    rows = rows[np.argsort(-rates, kind='stable')]
+    table = offers_table(dataset, rows)
+
+    # Without a search text the KPIs are a lookup in the aggregate cube
+    kpis = None if spec.search else dataset.kpis(spec.mes, spec.calif, spec.plazo, spec.min_calif)
+    start, stop = dataset.month_ranges.get(spec.mes, (0, 0))
+    return FilterResult(table, stop - start, kpis)
+
+
+def offers_table(dataset, rows):
+    """Return the offers table of ``rows``, with their rate changes"""
+    # The changes were aligned for every row at load; this is a gather
+    table = dataset.df[TABLE_COLUMNS].take(rows)
+    deltas = pd.DataFrame(dataset.deltas.take(rows), index=table.index)
+    return pd.concat([table, deltas], axis=1)
+
+
+def top_rows(rows, scores, n):
+    """Return the ``n`` of ``rows`` with the highest ``scores``, highest first.
+
+    Only the top ``n`` are selected with a partial partition and then
+    sorted, instead of sorting every row. Ties keep file order and rows
+    with a missing score are never returned.
+    """
+    keep = ~np.isnan(scores)
+    rows, scores = rows[keep], scores[keep]
+    if n < len(rows):
+        top = np.argpartition(-scores, n - 1)[:n]
+        rows, scores = rows[top], scores[top]
+    return rows[np.lexsort((rows, -scores))]
+
+
+def best_rows(dataset, spec, n):
+    """Return the row positions of the ``n`` best rates selected by ``spec``, best first"""
+    rows = matching_rows(dataset, spec)
+    return top_rows(rows, dataset.df['tasa_pasiva_efectiva'].to_numpy()[rows], n)
+
+
+def top_movers(dataset, spec, column='delta_mes', n=10):
+    """Return the offers selected by ``spec`` whose rate changed the most.
+
+    ``column`` is one of DELTA_COLUMNS; the ``n`` largest changes in either
+    direction come first. Offers that did not exist at the earlier month
+    are left out.
+    """
+    rows = matching_rows(dataset, spec)
+    rows = top_rows(rows, np.abs(dataset.deltas.values[column][rows]), n)
+    return offers_table(dataset, rows)
+
+
+def trend_series(dataset, entities, plazos):
+    """Return (label, monthly rates) for every selected (entity, plazo) with any data.
+
+    Rates line up with ``dataset.months`` and are NaN for months without
+    an offer.
+    """
+    series = []
+    for entity in entities:
+        for plazo in plazos:
+            values = dataset.trend(entity, plazo)
+            if not np.isnan(values).all():
+                series.append((f"{entity} ({plazo} días)", values))
+    return series
+
+
+def top_entities(dataset, plazo, n=3):
+    """Return the ``n`` entities with the best rate at ``plazo`` in the latest month"""
+    trends = dataset.trends
+    plazo_code = trends.plazos.get(plazo)
+    if plazo_code is None or not dataset.months:
+        return []
+    latest = trends.values[:, plazo_code, dataset.month_code(dataset.latest_month)]
+    order = np.argsort(-latest, kind='stable')[:n]
+    names = list(trends.entities)
+    return [names[code] for code in order if not np.isnan(latest[code])]
@@ -0,0 +1,189 @@
+"""Equivalence checks of the query engine against plain pandas.
+
+Run with ``python -m pytest -q``. Every check builds its expectation from
+the synthetic CSV of ``tasas_benchmark.generate_tasas`` with ordinary
+pandas operations and compares the engine's answer to it.
+"""
+import itertools
+import mmap
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import tasas_data
+from tasas_benchmark import generate_tasas
+from tasas_query import best_rows, filter_spec, query, top_movers
+
+MONTHS = 14
+SEARCHES = ['', 'banco', 'credito']
+CALIFS = ['Todos', 'AA', 'NR', 'ZZZ']
+PLAZOS = ['Todos', 30, 360, 999]
+MIN_CALIFS = ['Todos', 'AAA', 'A-', 'BBB']
+
+
+@pytest.fixture(scope='module')
+def tasas_csv(tmp_path_factory):
+    path = tmp_path_factory.mktemp('tasas') / 'tasas.csv'
+    generate_tasas(path, rows=6000, entities=30, months=MONTHS, seed=1)
+    # Missing rates and plazos too, so the -1 and NaN paths are exercised
+    raw = pd.read_csv(path)
+    raw.loc[raw.index[::97], 'tasa_pasiva_efectiva'] = np.nan
+    raw.loc[raw.index[::89], 'plazo'] = np.nan
+    raw.to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture(scope='module')
+def raw(tasas_csv):
+    # Row positions of the dataset: stably sorted by month
+    df = pd.read_csv(tasas_csv, dtype={'ULTIMA_CALIFICACIÓN': object, 'razon_social': object})
+    return df.sort_values('mes', kind='stable').reset_index(drop=True)
+
+
+@pytest.fixture(scope='module')
+def dataset(tasas_csv):
+    return tasas_data.ingest_csv(str(tasas_csv), chunksize=1000)
+
+
+def expected_rows(raw, mes, search, calif, plazo, min_calif):
+    """Select the offers of one filter combination with plain pandas"""
+    mask = raw['mes'] == mes
+    if search:
+        names = raw['razon_social'].map(lambda name: tasas_data.normalize_text(name))
+        mask &= names.str.contains(search, regex=False)
+    if calif != 'Todos':
+        mask &= raw['ULTIMA_CALIFICACIÓN'] == calif
+    if plazo != 'Todos':
+        mask &= raw['plazo'] == plazo
+    if min_calif != 'Todos':
+        rank = raw['ULTIMA_CALIFICACIÓN'].map(tasas_data.RATING_RANK)
+        mask &= rank <= tasas_data.RATING_RANK[min_calif]
+    return raw[mask].sort_values('tasa_pasiva_efectiva', ascending=False, kind='stable')
+
+
+def assert_same_columns(df, expected):
+    assert list(df.columns) == list(expected.columns)
+    for column in expected.columns:
+        actual, wanted = df[column], expected[column]
+        assert actual.dtype == wanted.dtype, column
+        if isinstance(wanted.dtype, pd.CategoricalDtype):
+            np.testing.assert_array_equal(actual.cat.codes.to_numpy(), wanted.cat.codes.to_numpy())
+        else:
+            np.testing.assert_array_equal(actual.to_numpy(), wanted.to_numpy())
+
+
+def assert_mapped(df):
+    # Code widths or dtypes that pandas would change force a private copy
+    for column in df.columns:
+        values = df[column].array
+        values = values.codes if isinstance(values, pd.Categorical) else values.to_numpy()
+        while values is not None and not isinstance(values, mmap.mmap):
+            values = getattr(values, 'base', None)
+        assert values is not None, column
+
+
+def assert_same_indexes(indexes, expected):
+    for name, index in expected.items():
+        state, arrays = index.to_snapshot()
+        other_state, other_arrays = indexes[name].to_snapshot()
+        assert other_state == state, name
+        for key in arrays:
+            np.testing.assert_allclose(other_arrays[key], arrays[key], rtol=1e-6)
+
+
+def assert_kpis(result, rows):
+    rates = rows['tasa_pasiva_efectiva'].astype('float32').astype('float64')
+    if rates.notna().any():
+        assert result.mean == pytest.approx(rates.mean(), rel=1e-6)
+        assert result.max == pytest.approx(rates.max())
+        assert result.min == pytest.approx(rates.min())
+    else:
+        assert np.isnan(result.mean) and np.isnan(result.max) and np.isnan(result.min)
+    assert result.nunique == rows['razon_social'].nunique()
+
+
+def test_snapshot_columns_match_pandas_for_any_chunk_size(tasas_csv, tmp_path):
+    expected = tasas_data.typed_frame(tasas_data.read_tasas_csv(tasas_csv))
+    # Indexes built in memory, all rows at once
+    indexes = tasas_data.build_indexes(expected, len(expected['mes'].cat.categories), block_rows=10**6)
+    for chunksize in (1000, 777, 10**6):
+        path = tmp_path / f"chunks-{chunksize}.csv"
+        shutil.copy(tasas_csv, path)
+        dataset = tasas_data.ingest_csv(str(path), chunksize=chunksize)
+        assert_same_columns(dataset.df, expected)
+        assert_mapped(dataset.df)
+        assert_same_indexes(dataset.indexes, indexes)
+
+
+def test_query_matches_pandas(dataset, raw):
+    months = dataset.months[-2:]
+    combinations = itertools.product(months, SEARCHES, CALIFS, PLAZOS, MIN_CALIFS)
+    checked = 0
+    for mes, search, calif, plazo, min_calif in combinations:
+        result = query(dataset, filter_spec(mes, search, calif, plazo, min_calif))
+        rows = expected_rows(raw, mes, search, calif, plazo, min_calif)
+
+        assert result.table.index.tolist() == rows.index.tolist(), (mes, search, calif, plazo, min_calif)
+        assert result.month_rows == int((raw['mes'] == mes).sum())
+        assert_kpis(result, rows)
+        checked += 1
+    assert checked == 384
+
+
+def test_best_rows_match_a_full_sort(dataset, raw):
+    mes = dataset.latest_month
+    for plazo, n in itertools.product(['Todos', 30, 360], [1, 5, 50, 10**6]):
+        rows = expected_rows(raw, mes, '', 'Todos', plazo, 'Todos').dropna(subset=['tasa_pasiva_efectiva'])
+        best = best_rows(dataset, filter_spec(mes, plazo=plazo), n)
+        assert best.tolist() == rows.index[:n].tolist()
+
+
+def test_trends_and_deltas_match_groupby(dataset, raw):
+    means = raw.groupby(['razon_social', 'plazo', 'mes'])['tasa_pasiva_efectiva'].mean()
+    for (entity, plazo), group in means.groupby(level=[0, 1]):
+        expected = group.droplevel([0, 1]).reindex(dataset.months)
+        np.testing.assert_allclose(dataset.trend(entity, plazo), expected.to_numpy(), rtol=1e-5)
+
+    previous = (pd.PeriodIndex(raw['mes'], freq='M') - 1).astype(str)
+    keys = pd.MultiIndex.from_arrays([raw['razon_social'], raw['plazo'], previous])
+    earlier = means.astype('float32').reindex(keys).to_numpy()
+    expected = raw['tasa_pasiva_efectiva'].astype('float32').to_numpy() - earlier
+    np.testing.assert_allclose(dataset.deltas.values['delta_mes'], expected, rtol=1e-5, atol=1e-5)
+
+    movers = top_movers(dataset, filter_spec(dataset.latest_month), n=10)
+    changes = np.abs(movers['delta_mes'].to_numpy())
+    assert len(movers) == 10 and (np.diff(changes) <= 0).all()
+
+
+def test_rating_limit_follows_the_scale():
+    categories = tasas_data.rating_categories(['NR', 'A', 'AAA', 'BB', 'AA-'])
+    assert categories == ['AAA', 'AA-', 'A', 'BB', 'NR']
+    assert tasas_data.rating_limit(categories, 'AAA') == 1
+    assert tasas_data.rating_limit(categories, 'A+') == 2
+    assert tasas_data.rating_limit(categories, 'B-') == 4
+    assert tasas_data.rating_limit(categories, 'NR') == 0
+
+
+def test_incremental_append_matches_a_full_ingestion(tasas_csv, tmp_path):
+    path = tmp_path / 'tasas.csv'
+    shutil.copy(tasas_csv, path)
+    registry = tasas_data.DatasetRegistry(str(path))
+    before = registry.current()
+
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('2025-03,BANCO NUEVO,AA,90,5.5\n,SIN MES,A,30,4.0\n2025-02,BANCO 0,AAA,3')
+    # The last line is still being written: only the complete ones are merged
+    partial = registry.refresh(force=True)
+    assert len(partial) == len(before) + 1
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('0,6.25\n')
+    dataset = registry.refresh(force=True)
+    assert dataset.version == tasas_data.content_version(str(path))
+
+    reference = tmp_path / 'reference.csv'
+    shutil.copy(path, reference)
+    expected = tasas_data.ingest_csv(str(reference))
+    assert_same_columns(dataset.df, expected.df)
+    assert_same_indexes(dataset.indexes, expected.indexes)